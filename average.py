@@ -0,0 +1,94 @@
+#! /usr/bin/env python3
+
+import numpy
+import pandas as pd
+from pandas.tseries.offsets import MonthEnd
+from datetime import date
+
+
+def _month_number(year, month):
+    return year * 12 + month - 1
+
+
+def period_ends(firstDay, periodMonths=6):
+    """List the end day of each period, from last month's last day back to the first recorded day
+
+    Args:
+        firstDay (pandas._libs.tslibs.timestamps.Timestamp): First day recorded
+        periodMonths (int, optional): Length of a period in months. Defaults to 6.
+
+    Returns:
+        list: The end day of each period, the most recent first. The last element is firstDay
+    """
+
+    # Start calculating from last month's last day
+    endPeriod = date.today() - pd.DateOffset(months=1)
+    endPeriod += MonthEnd(0)
+
+    ends = [endPeriod]
+    while True:
+        endPeriod -= pd.DateOffset(months=periodMonths)  # New end period moved back of a period
+        if endPeriod <= firstDay:  # We've reached the end of the dataframe
+            ends.append(firstDay)
+            return ends
+        ends.append(endPeriod)
+
+
+def compute_averages(_df, periodMonths=6):
+    """Compute in one pass every average the charts display for a monthly spending dataframe
+
+    The monthly amounts are handled as an array of cents indexed by month number: the average of every period is
+    read out of a single cumulative sum. The current month is never accounted for as it is not complete.
+
+    Args:
+        _df (pandas.core.frame.DataFrame): A category's spending per month, indexed by the first day of each month
+        periodMonths (int, optional): Length in months of the periods to average. Defaults to 6.
+
+    Returns:
+        dict: [period_dates], [period_values] = each period's average, listed twice (at its end then at its start, the
+            most recent first) to be plotted as steps; [absolute] = average of all the months;
+            [trimmed] = average of all the months, without the extremums nor the months without spending
+    """
+
+    months = _month_number(_df.index.year.values, _df.index.month.values)
+    order = numpy.argsort(months, kind='stable')
+    months = months[order]
+    cents = numpy.rint(_df['amount'].values.astype(float) * 100).astype(numpy.int64)[order]
+
+    today = date.today()
+    current_month = _month_number(today.year, today.month)
+    complete = months != current_month
+
+    # Average over each period: months in ]end - periodMonths; end]
+    ends = period_ends(_df.index.min(), periodMonths)
+    end_months = numpy.array([_month_number(end.year, end.month) for end in ends[:-1]])
+    cumulated_cents = numpy.concatenate(([0], numpy.cumsum(numpy.where(complete, cents, 0))))
+    cumulated_count = numpy.concatenate(([0], numpy.cumsum(complete)))
+    first = numpy.searchsorted(months, end_months - (periodMonths - 1), side='left')
+    last = numpy.searchsorted(months, end_months, side='right')
+    period_cents = cumulated_cents[last] - cumulated_cents[first]
+    period_count = cumulated_count[last] - cumulated_count[first]
+
+    period_dates, period_values = [], []
+    for index, (total, count) in enumerate(zip(period_cents, period_count)):
+        value = _mean(total, count)
+        period_dates += [ends[index], ends[index + 1]]
+        period_values += [value, value]
+
+    # All time averages, until today
+    absolute = (months <= current_month)
+    trimmed = absolute.copy()
+    for extremum in (numpy.max, numpy.min):
+        if trimmed.any():
+            trimmed &= cents != extremum(cents[trimmed])
+    trimmed &= cents != 0
+
+    return {'period_dates': period_dates,
+            'period_values': period_values,
+            'absolute': _mean(cents[absolute & complete].sum(), (absolute & complete).sum()),
+            'trimmed': _mean(cents[trimmed & complete].sum(), (trimmed & complete).sum())}
+
+
+def _mean(total_cents, count):
+    # Handles the cases where there is no month to average
+    return 0 if count == 0 else int(total_cents / (count * 100))
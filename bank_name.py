@@ -1,2 +1,3 @@
 SCOTIABANK = "scotiabank"
 BMO = "bmo"
+SCOTIABANK_CHECKING = "scotiabank_checking"
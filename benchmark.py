@@ -0,0 +1,326 @@
+#! /usr/bin/env python3
+
+import io
+import os
+import re
+import sys
+import json
+import time
+import random
+import subprocess
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import contextlib
+from datetime import date, timedelta
+import matplotlib
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_pdf import PdfPages
+import pandas as pd
+import category
+import category_name
+import organizer
+import render
+import statement_handler as sh
+from merchant_cache import MerchantCache
+
+cities = ["VANCOUVER    BC", "BURNABY      BC", "KAMLOOPS     BC", "RICHMOND     BC", "MONTREAL     QC"]
+unknown_merchants = ["AMAZON *MARKETPLCE CA", "CDN TIRE STORE", "IKEA", "BEST BUY", "LONDON DRUGS", "WINNERS", "MEC",
+                     "SHOPPERS DRUG MART", "HOME DEPOT", "APPLE.COM/BILL"]
+
+
+def merchant_vocabulary():
+    """Turn the keywords of category.py into merchant names, plus some merchants matching no category
+
+    Returns:
+        list: Merchant names, upper case like in the statements
+    """
+
+    vocabulary = []
+    for name, keywords in vars(category).items():
+        # The category tree and Transport only gather the other lists
+        if not isinstance(keywords, list) or name == 'Transport' or not all(isinstance(keyword, str) for keyword in keywords):
+            continue
+        for keyword in keywords:
+            # "pub[^a-z]" -> "pub ", "evo *car *share" -> "evo car share"
+            keyword = re.sub(r'\[[^\]]*\]', ' ', keyword).replace(' *', ' ').replace('\\', '')
+            vocabulary.append(keyword.upper().strip())
+    return vocabulary + unknown_merchants
+
+
+def generate_statements(folder, rows, years, files, seed=0):
+    """Write synthetic Scotiabank and BMO statements, half of the rows each
+
+    Args:
+        folder (str): Folder to write the statements into
+        rows (int): Total number of rows
+        years (int): Years of history, until today
+        files (int): Number of statements per bank
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        list: Path to the generated statements
+    """
+
+    rng = random.Random(seed)
+    vocabulary = merchant_vocabulary()
+    first_day = date.today() - timedelta(days=365 * years)
+    days = (date.today() - first_day).days
+    csv_files = []
+
+    for index in range(files):
+        scotiabank_file = os.path.join(folder, f"scotiabank_{index:03}.csv")
+        bmo_file = os.path.join(folder, f"bmo_{index:03}.csv")
+        file_rows = rows // (2 * files)
+
+        with open(scotiabank_file, 'w') as scotiabank, open(bmo_file, 'w') as bmo:
+            for row in range(file_rows):
+                day = first_day + timedelta(days=rng.randrange(days))
+                place = f"{rng.choice(vocabulary)} #{rng.randrange(1000):04}    {rng.choice(cities)}"
+                amount = round(rng.lognormvariate(3, 1), 2)
+                income = rng.random() < 0.05
+                # Scotiabank lists spendings as negative values, BMO as positive ones
+                scotiabank.write(f'{day.month}/{day.day}/{day.year},"{place} ",{amount if income else -amount}\n')
+
+                day = first_day + timedelta(days=rng.randrange(days))
+                place = f"{rng.choice(vocabulary)} {rng.choice(cities)}"
+                bmo.write(f"{row},'5191230',{day:%Y%m%d},{day:%Y%m%d},{-amount if income else amount},{place}\n")
+
+        csv_files += [scotiabank_file, bmo_file]
+
+    return csv_files
+
+
+class Stages:
+    """Time each benchmarked stage, and measure its peak memory with tracemalloc"""
+
+    def __init__(self, measure_memory=True):
+        self.measure_memory = measure_memory
+        self.results = []
+
+    @contextlib.contextmanager
+    def stage(self, name, rows):
+        if self.measure_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):  # modules are chatty
+            yield
+        seconds = time.perf_counter() - start
+        peak = None
+        if self.measure_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        self.results.append({'stage': name,
+                             'seconds': round(seconds, 6),
+                             'rows': rows,
+                             'rows_per_sec': round(rows / seconds, 1) if seconds > 0 else None,
+                             'peak_memory_bytes': peak})
+        print(f"{name:<45} {seconds:>9.3f}s", file=sys.stderr)
+
+
+def memory_report(spending_df, transactions):
+    """Compare the memory taken by the parsed spendings and by their compact categorised representation
+
+    Args:
+        spending_df (pandas.core.frame.DataFrame): The parsed statements
+        transactions (pandas.core.frame.DataFrame): The same spendings, as organizer.categorise() returns them
+
+    Returns:
+        dict: Bytes taken by each representation, in total and extrapolated to a million spendings
+    """
+
+    parsed = int(spending_df.memory_usage(deep=True).sum())
+    compact = int(transactions.memory_usage(deep=True).sum())
+    rows = max(len(transactions), 1)
+    print(f"{'memory (parsed -> compact)':<45} {parsed / 2**20:>8.1f}MB -> {compact / 2**20:.1f}MB", file=sys.stderr)
+
+    return {'parsed_bytes': parsed,
+            'compact_bytes': compact,
+            'parsed_bytes_per_million_rows': parsed * 1000000 // rows,
+            'compact_bytes_per_million_rows': compact * 1000000 // rows,
+            'columns': {column: int(size) for column, size in transactions.memory_usage(deep=True, index=False).items()}}
+
+
+def startup_report(runs=5):
+    """Time the start of the compute.py commands that render nothing, and check they do not import the heavy modules
+
+    Args:
+        runs (int, optional): Number of runs of each command, the fastest one is kept. Defaults to 5.
+
+    Returns:
+        dict: [command] = {[seconds] = fastest run, [pandas], [matplotlib] = whether the command imported them}
+    """
+
+    compute = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'compute.py')
+    commands = {'--help': ['--help'],
+                'categorize <place>': ['categorize', 'TIM HORTONS #0335 KAMLOOPS BC']}
+    # Runs the command then tells which of the heavy modules it imported
+    probe = ("import runpy, sys; sys.argv = sys.argv[1:]\n"
+             "try:\n    runpy.run_path(sys.argv[0], run_name='__main__')\nexcept SystemExit:\n    pass\n"
+             "print(' '.join(name for name in ('pandas', 'matplotlib') if name in sys.modules), file=sys.stderr)")
+
+    results = {}
+    for name, args in commands.items():
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, compute] + args, stdout=subprocess.DEVNULL, check=True)
+            timings.append(time.perf_counter() - start)
+        imported = subprocess.run([sys.executable, '-c', probe, compute] + args, stdout=subprocess.DEVNULL,
+                                  stderr=subprocess.PIPE, check=True, universal_newlines=True).stderr.split()
+        results[name] = {'seconds': round(min(timings), 6),
+                         'pandas': 'pandas' in imported,
+                         'matplotlib': 'matplotlib' in imported}
+        print(f"{'startup ' + name:<45} {min(timings):>9.3f}s {' '.join(imported)}", file=sys.stderr)
+
+    return results
+
+
+def render_scaling(months_list, seed=0):
+    """Time the rendering of the bar charts against the number of months: default rendering, fast rendering, and fast
+    rendering drawing into the figure of a previous run
+
+    Args:
+        months_list (list): Numbers of months of history to render
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        list: [months], then the seconds taken by each rendering mode to build both bar charts and draw them as PNG
+    """
+
+    plt.switch_backend('Agg')
+    rng = random.Random(seed)
+    names = [category_name.GROCERIES, category_name.TRANSPORT, category_name.RESTAURANT, category_name.COFFEE,
+             category_name.BAR, category_name.MISC]
+    results = []
+
+    for months in months_list:
+        index = pd.date_range(end=pd.Timestamp(date.today().replace(day=1)), periods=months, freq='MS')
+        monthly_spending = []
+        for name in names:
+            el = pd.DataFrame({'amount': [round(rng.uniform(0, 1000), 2) for _ in range(months)]}, index=index)
+            el.name = name
+            monthly_spending.append(el)
+
+        result = {'months': months}
+        templates = {}
+        for mode, fast, reuse in (('default', False, False), ('fast', True, False), ('fast_reused_figure', True, True)):
+            if reuse:  # the templates are built beforehand, like on a previous run
+                with contextlib.redirect_stdout(io.StringIO()):
+                    templates = {builder: getattr(render, builder)(monthly_spending, fast=True)
+                                 for builder in ('monthly_bar_by_cat', 'monthly_bar_stacked')}
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                for builder in ('monthly_bar_by_cat', 'monthly_bar_stacked'):
+                    fig = getattr(render, builder)(monthly_spending, fast=fast, fig=templates.get(builder))
+                    fig.savefig(io.BytesIO(), format='png')
+                    plt.close(fig)
+            result[mode] = round(time.perf_counter() - start, 6)
+            templates = {}
+        print(f"{'render ' + str(months) + ' months':<45} " + ' '.join(f"{mode} {seconds:.3f}s" for mode, seconds in result.items()
+                                                                      if mode != 'months'), file=sys.stderr)
+        results.append(result)
+
+    return results
+
+
+def run(rows, years, files, seed=0, measure_memory=True):
+    """Generate statements then time each stage of the report generation
+
+    Args:
+        rows (int): Total number of statement rows
+        years (int): Years of history
+        files (int): Number of statements per bank
+        seed (int, optional): Random seed. Defaults to 0.
+        measure_memory (bool, optional): Measure the peak memory of each stage, slows down the stages. Defaults to True.
+
+    Returns:
+        dict: The benchmark parameters and the result of each stage
+    """
+
+    plt.switch_backend('Agg')  # never open a window
+    stages = Stages(measure_memory)
+    organizer.merchant_cache = MerchantCache()  # start cold
+
+    with tempfile.TemporaryDirectory() as folder:
+        csv_files = generate_statements(folder, rows, years, files, seed)
+
+        with stages.stage('statement_handler.parse_statement', rows):
+            spending_df = pd.concat([sh.parse_statement(csv_file) for csv_file in csv_files], ignore_index=True)
+        spendings = len(spending_df)
+
+        with stages.stage('organizer.categorise', spendings):
+            transactions = organizer.categorise(spending_df)
+        memory = memory_report(spending_df, transactions)
+
+        with stages.stage('organizer.organise_data_by_category', spendings):
+            all_data = organizer.organise_data_by_category(transactions)
+
+        transport_rows = len(all_data[category_name.TRANSPORT])
+        with stages.stage('organizer.organise_transport_by_sub_cat', transport_rows):
+            organizer.organise_transport_by_sub_cat(all_data[category_name.TRANSPORT])
+
+        with stages.stage('organizer.monthly_matrix_by', spendings):
+            monthly_all = organizer.monthly_matrix_by(transactions, 'category')
+            monthly_all_transport = organizer.monthly_matrix_by(all_data[category_name.TRANSPORT], 'sub_category')
+
+        monthly_spending = [organizer.monthly_spending(monthly_all, name)
+                            for name in [category_name.BILLS, category_name.GROCERIES, category_name.TRANSPORT,
+                                         category_name.RESTAURANT, category_name.COFFEE, category_name.BAR, category_name.MISC]]
+        monthly_transport = [organizer.monthly_spending(monthly_all_transport, name)
+                             for name in [category_name.TR_CARSHARE, category_name.TR_RENTAL, category_name.TR_CAB,
+                                          category_name.TR_TRANSLINK, category_name.TR_CAR]]
+        months = len(monthly_all)
+
+        figures = []
+        with stages.stage('render.monthly_bar_by_cat', months):
+            figures.append(render.monthly_bar_by_cat(monthly_spending[1:]))
+        with stages.stage('render.monthly_bar_stacked', months):
+            figures.append(render.monthly_bar_stacked(monthly_spending))
+        with stages.stage('render.average_pie', months):
+            figures.append(render.average_pie(monthly_spending))
+        with stages.stage('render.monthly_bar_by_cat (transport)', months):
+            figures.append(render.monthly_bar_by_cat(monthly_transport, useAbsoluteAvg=True))
+
+        with stages.stage('pdf write', months):
+            doc = PdfPages(os.path.join(folder, 'overview.pdf'))
+            for figure in figures:
+                figure.savefig(doc, format='pdf')
+            doc.close()
+
+    return {'parameters': {'rows': rows, 'years': years, 'files': files, 'seed': seed},
+            'environment': {'python': platform.python_version(), 'pandas': pd.__version__,
+                            'matplotlib': matplotlib.__version__, 'machine': platform.machine()},
+            'spendings': spendings,
+            'months': months,
+            'memory': memory,
+            'category_cache': {'hits': organizer.merchant_cache.hits, 'misses': organizer.merchant_cache.misses},
+            'stages': stages.results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time each stage of the report generation on synthetic statements")
+    parser.add_argument('--rows', type=int, default=100000, help="total number of statement rows (default: %(default)s)")
+    parser.add_argument('--years', type=int, default=5, help="years of history (default: %(default)s)")
+    parser.add_argument('--files', type=int, default=12, help="number of statements per bank (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0, help="random seed (default: %(default)s)")
+    parser.add_argument('--no-memory', action='store_true', help="do not measure peak memory, for more accurate timings")
+    parser.add_argument('--startup', action='store_true', help="also time the start of the commands that render nothing")
+    parser.add_argument('--render-months', metavar='N,N,...',
+                        help="also time the bar charts rendering for these numbers of months, i.e: 12,60,120,240")
+    parser.add_argument('--output', help="write the JSON results into this file instead of stdout")
+    options = parser.parse_args()
+
+    results = run(options.rows, options.years, options.files, options.seed, not options.no_memory)
+    if options.startup:
+        results['startup'] = startup_report()
+    if options.render_months:
+        results['render_scaling'] = render_scaling([int(months) for months in options.render_months.split(',')], options.seed)
+
+    if options.output:
+        with open(options.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
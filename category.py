@@ -1,3 +1,5 @@
+import category_name
+
 Groceries = ["iga", "save on foods", "nesters", "t&t", "kiki", "yig", "persia foods", "whole foods",
              "organic acres market", "danial market", "choices", "safeway", "market", "urban fare",
              "nofrills", "costco", "supermarket"]
@@ -33,3 +35,19 @@ TransportTranslink = ["compass"]
 TransportMisc = ["poparide", "amtrack", "boltbus"]
 TransportCar = ["midas", "impark"]
 Transport = TransportCarShare + TransportRental + TransportCab + TransportTranslink + TransportMisc + TransportCar
+
+# Category tree in priority order: a spending goes into the first category matching its place, then into the first of
+# that category's sub categories matching it.
+# (category name, category list, [(sub category name, sub category list)], default sub category)
+# A category also matches the keywords of its sub categories. Its own keywords go into the default sub category.
+Tree = [(category_name.GROCERIES, Groceries, [], None),
+        (category_name.TRANSPORT, [], [(category_name.TR_CARSHARE, TransportCarShare),
+                                       (category_name.TR_RENTAL, TransportRental),
+                                       (category_name.TR_CAB, TransportCab),
+                                       (category_name.TR_TRANSLINK, TransportTranslink),
+                                       (category_name.TR_MISC, TransportMisc),
+                                       (category_name.TR_CAR, TransportCar)], category_name.TR_MISC),
+        (category_name.RESTAURANT, Restaurant, [], None),
+        (category_name.COFFEE, Coffee, [], None),
+        (category_name.BAR, Bar, [], None),
+        (category_name.BILLS, Bills, [], None)]
@@ -2,106 +2,539 @@
 
 import sys
 import os
-from matplotlib.backends.backend_pdf import PdfPages
-import pandas as pd
+import json
+import argparse
 import category_name
-import render
-import statement_handler as sh
-import organizer
+import overview
 
-# To get rid of pandas' matplotlib "FutureWarning"
-from pandas.plotting import register_matplotlib_converters
-register_matplotlib_converters()
+# Only light modules are imported at start up. pandas, the statements handling and above all matplotlib are imported by
+# the commands needing them, so that the commands that do not render anything start fast
 
-credit_card_statement_folder = os.path.dirname(os.path.abspath(__file__)) + "/statements/CreditCard"
-checking_account_statement_folder = os.path.dirname(os.path.abspath(__file__)) + "/statements/Checking"
+statements_folder = os.path.dirname(os.path.abspath(__file__)) + "/statements"
 output_pdf = os.path.dirname(os.path.abspath(__file__)) + "/overview.pdf"
+category_cache_file = os.path.dirname(output_pdf) + "/category_cache.json"
 
+COMMANDS = ['report', 'debug', 'categorize', 'stats', 'serve', 'watch', 'query']
+DEBUG_CATEGORIES = [category_name.GROCERIES, category_name.TRANSPORT, category_name.RESTAURANT, category_name.COFFEE,
+                    category_name.BAR, category_name.MISC, category_name.BILLS]
 
-if __name__ == "__main__":
-    # Let's handle the potential debug parameters first
-    if len(sys.argv) >= 2 and sys.argv[1].lower() == "debug":
-        print("\n--- DEBUG ---")
-        debug_pd = []
-        if len(sys.argv) >= 3:
-            for arg in sys.argv[2:]:
-                l_arg = arg.lower()
-                if l_arg == category_name.GROCERIES \
-                        or l_arg == category_name.TRANSPORT \
-                        or l_arg == category_name.RESTAURANT \
-                        or l_arg == category_name.COFFEE \
-                        or l_arg == category_name.BAR \
-                        or l_arg == category_name.MISC \
-                        or l_arg == category_name.BILLS:
-                    debug_pd.append(l_arg)
-                elif l_arg == "all":  # if all then redefine everything and exit the loop. So that we don't have doubles
-                    debug_pd = [category_name.GROCERIES, category_name.TRANSPORT, category_name.RESTAURANT, category_name.COFFEE, category_name.BAR, category_name.MISC, category_name.BILLS]
-                    break
-                else:
-                    print(f" '{arg}' Unknown parameter. Parameter accepted are: groceries, transport, restaurant, coffee, bar, misc, all")
-                    print("i.e: ./overview debug bar coffee")
-                    exit()
-        else:
-            debug_pd.append("misc")
+
+def update_transactions(statements_folder, data_folder, jobs=1, use_threads=False):
+    """Bring the transaction store of a statements folder up to date and categorise its spendings
+
+    Args:
+        statements_folder (str): Path to the statements folder, holding CreditCard and optionally Checking
+        data_folder (str): Folder the transaction store is kept in
+        jobs (int, optional): Number of statements parsed at the same time. Defaults to 1.
+        use_threads (bool, optional): Parse with threads instead of processes. Defaults to False.
+
+    Raises:
+        FileNotFoundError: If the statements folder does not exist
+
+    Returns:
+        dict: The transaction store
+    """
+
+    import transaction_store
+
+    csv_files, checking_files = overview.statement_files(statements_folder)
+
+    # Only the new or modified statements are parsed, the others are already in the transaction store
+    store_file = data_folder + "/transactions.pkl"
+    store = transaction_store.load_store(store_file)
+    files, keywords = dict(store['files']), store['keywords']
+    changed = transaction_store.update_store(store, csv_files + checking_files, jobs=jobs, use_threads=use_threads)
+    # Only the new spendings and the ones whose category may have changed since category.py was edited are categorised
+    transaction_store.categorise_store(store)
+    # An unchanged store is not written again: the cost of a run follows the new data, not the whole history
+    if changed or store['files'] != files or store['keywords'] != keywords:
+        transaction_store.save_store(store, store_file)
+    return store
+
+
+def transaction_database(statements_folder, data_folder, jobs=1, use_threads=False):
+    """Open the SQLite transaction database of a data folder and bring it up to date with the statements
+
+    The database is then the transaction store: the spendings are read out of it, transactions.pkl is not loaded.
+
+    Args:
+        statements_folder (str): Path to the statements folder, holding CreditCard and optionally Checking
+        data_folder (str): Folder the database is kept in
+        jobs (int, optional): Number of statements parsed at the same time. Defaults to 1.
+        use_threads (bool, optional): Parse with threads instead of processes. Defaults to False.
+
+    Raises:
+        FileNotFoundError: If the statements folder does not exist
+
+    Returns:
+        sqlite3.Connection: The database, see transaction_db
+    """
+
+    import transaction_db
+
+    csv_files, checking_files = overview.statement_files(statements_folder)
+    connection = transaction_db.connect(data_folder + "/transactions.sqlite")
+    transaction_db.sync_statements(connection, csv_files + checking_files, jobs=jobs, use_threads=use_threads)
+    return connection
+
+
+def monthly_matrices(store, data_folder):
+    """Get the month x category matrices of the spendings of a transaction store
+
+    All the monthly totals are computed at once, each category's spending is then just a column of the matrix.
+    The matrices are cached: only the months of the modified statements are computed again
+
+    Args:
+        store (dict): The categorised transaction store, see update_transactions()
+        data_folder (str): Folder the monthly spendings cache is kept in
+
+    Returns:
+        tuple: The month x category matrix of the categories and the one of the transport sub categories
+    """
+
+    import matrix_cache
+
+    cache_file = data_folder + "/monthly_cache.pkl"
+    cache = matrix_cache.load_cache(cache_file)
+    matrices = matrix_cache.monthly_matrices(cache, store)
+    matrix_cache.save_cache(cache, cache_file)
+    return matrices
+
+
+def generate_report(statements_folder, output_pdf, jobs=1, use_threads=False, chunksize=0, render_jobs=1, fast_render=False,
+                    sqlite=False):
+    """Read the statements of a statements folder and write their overview PDF
+
+    The transaction store and the monthly spendings cache are kept next to the PDF. The merchant cache is left to the
+    caller, so that several reports share it.
+
+    Args:
+        statements_folder (str): Path to the statements folder, holding CreditCard and optionally Checking
+        output_pdf (str): Path to the PDF to write
+        jobs (int, optional): Number of statements parsed at the same time. Defaults to 1.
+        use_threads (bool, optional): Parse with threads instead of processes. Defaults to False.
+        chunksize (int, optional): Streaming mode if > 0, see organizer.stream_monthly_matrices(). Defaults to 0.
+        render_jobs (int, optional): Number of worker processes rendering the pages. Defaults to 1.
+        fast_render (bool, optional): Render the pages with the fast rendering, see render.build_page(). Defaults to False.
+        sqlite (bool, optional): Keep the spendings in a SQLite database instead of the transaction store and sum them
+            by month in SQL. Defaults to False.
+
+    Raises:
+        FileNotFoundError: If the statements folder or the PDF's folder do not exist
+    """
+
+    import render
+    # To get rid of pandas' matplotlib "FutureWarning"
+    from pandas.plotting import register_matplotlib_converters
+    register_matplotlib_converters()
 
     # Verify hard codded output pdf path
     if not (os.path.exists(os.path.dirname(output_pdf))):
-        print(f"Could not access {os.path.dirname(output_pdf)} to output the results. Please verify path syntax")
+        raise FileNotFoundError(f"Could not access {os.path.dirname(output_pdf)} to output the results. Please verify path syntax")
+
+    if chunksize > 0:
+        import organizer
+        import statement_handler as sh
+        import transaction_store
+        # Each chunk is categorised and summed by month as soon as it is read, the spendings themselves are dropped.
+        # Only the checking account spendings and the credits are held, until their transfers are matched
+        csv_files, checking_files = overview.statement_files(statements_folder)
+        chunks = sh.iter_statement_chunks(csv_files + checking_files, chunksize, credits=True)
+        monthly_all, monthly_all_transport = organizer.stream_monthly_matrices(transaction_store.stream_spendings(chunks))
+    elif sqlite:
+        import transaction_db
+        connection = transaction_database(statements_folder, os.path.dirname(output_pdf), jobs=jobs, use_threads=use_threads)
+        monthly_all, monthly_all_transport = transaction_db.monthly_matrices(connection)
+        connection.close()
+    else:
+        store = update_transactions(statements_folder, os.path.dirname(output_pdf), jobs=jobs, use_threads=use_threads)
+        monthly_all, monthly_all_transport = monthly_matrices(store, os.path.dirname(output_pdf))
+
+    render.render_report(overview.report_pages(monthly_all, monthly_all_transport), output_pdf, jobs=render_jobs, fast=fast_render)
+    print("Output PDF document: {}".format(output_pdf))
+
+
+def load_profiles(profiles_file):
+    """Load the profiles of a batch: one report per household member
+
+    The file is a JSON list of {"name": str, "statements": statements folder, "output": PDF path} items. Relative paths
+    are relative to the profiles file. Each report must be written in its own folder, its caches are kept there.
+
+    Args:
+        profiles_file (str): Path to the profiles file
+
+    Raises:
+        ValueError: If a profile is invalid or two profiles share an output folder
+
+    Returns:
+        list: The profiles, as dictionaries with absolute paths
+    """
+
+    with open(profiles_file, 'r') as file:
+        items = json.load(file)
+
+    base_folder = os.path.dirname(os.path.abspath(profiles_file))
+    profiles = []
+    try:
+        for index, item in enumerate(items):
+            profiles.append({'name': str(item.get('name', index)),
+                             'statements': os.path.join(base_folder, item['statements']),
+                             'output': os.path.join(base_folder, item['output'])})
+    except (KeyError, TypeError, AttributeError) as error:
+        raise ValueError(f"Invalid profile in {profiles_file}: {error}")
+
+    output_folders = [os.path.dirname(profile['output']) for profile in profiles]
+    if len(set(output_folders)) != len(output_folders):
+        raise ValueError(f"Profiles of {profiles_file} must write their reports in different folders")
+    return profiles
+
+
+def _init_profile_worker(cache_file):
+    import matplotlib.pyplot as plt
+    import organizer
+    plt.switch_backend('Agg')  # no window from a worker
+    organizer.merchant_cache.load(cache_file)
+
+
+def _generate_profile_report(profile, options):
+    import organizer
+
+    print(f"--- {profile['name']} ---")
+    cache = organizer.merchant_cache
+    hits, misses = cache.hits, cache.misses
+    try:
+        generate_report(profile['statements'], profile['output'], **options)
+        error = None
+    except Exception as exception:
+        error = f"{type(exception).__name__}: {exception}"
+        print(f"** ERROR ** Could not generate the report of {profile['name']}: {error}")
+    # Sent back to the main process to share what has been learned about the merchants
+    return profile['name'], error, (cache.entries(), cache.hits - hits, cache.misses - misses)
+
+
+def generate_reports(profiles, profile_jobs=1, **options):
+    """Generate the reports of several profiles in a single process, or spread over a pool of worker processes
+
+    All the reports share the compiled category matchers and the merchant cache. A report that fails does not stop
+    the others.
+
+    Args:
+        profiles (list): The profiles, see load_profiles()
+        profile_jobs (int, optional): Number of reports generated at the same time. Defaults to 1.
+        options: Keyword arguments of generate_report()
+
+    Returns:
+        list: (profile name, error message) of the reports that failed
+    """
+
+    import organizer
+
+    if profile_jobs > 1 and len(profiles) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        # Nested worker pools are not worth it: the profiles already keep the workers busy
+        options = dict(options, jobs=1, render_jobs=1)
+        organizer.merchant_cache.save(category_cache_file)
+        with ProcessPoolExecutor(max_workers=profile_jobs, initializer=_init_profile_worker,
+                                 initargs=(category_cache_file,)) as executor:
+            results = list(executor.map(_generate_profile_report, profiles, [options] * len(profiles)))
+        for _, _, (entries, hits, misses) in results:
+            organizer.merchant_cache.update(entries)
+            organizer.merchant_cache.hits += hits
+            organizer.merchant_cache.misses += misses
+    else:
+        results = [_generate_profile_report(profile, options) for profile in profiles]
+
+    return [(name, error) for name, error, _ in results if error is not None]
+
+
+def report_command(options):
+    """Write the overview PDF, or the one of each profile in batch mode"""
+
+    report_options = {'jobs': options.jobs, 'use_threads': options.threads, 'chunksize': options.chunksize,
+                      'render_jobs': options.render_jobs, 'fast_render': options.fast_render,
+                      'sqlite': options.sqlite}
+    if options.batch:
+        try:
+            profiles = load_profiles(options.batch)
+        except (OSError, ValueError) as error:
+            print(f"** ERROR ** {error}")
+            sys.exit()
+        failures = generate_reports(profiles, profile_jobs=options.batch_jobs, **report_options)
+        print(f"{len(profiles) - len(failures)} of {len(profiles)} reports generated")
+    else:
+        generate_report(statements_folder, output_pdf, **report_options)
+
+
+def debug_command(options):
+    """Print the spendings of the given categories"""
+
+    import pandas as pd
+    import organizer
+    import transaction_store
+
+    debug_pd = []
+    for arg in options.categories or [category_name.MISC]:
+        l_arg = arg.lower()
+        if l_arg in DEBUG_CATEGORIES:
+            debug_pd.append(l_arg)
+        elif l_arg == "all":  # if all then redefine everything and exit the loop. So that we don't have doubles
+            debug_pd = DEBUG_CATEGORIES
+            break
+        else:
+            print(f" '{arg}' Unknown parameter. Parameter accepted are: groceries, transport, restaurant, coffee, bar, misc, bills, all")
+            print("i.e: ./compute.py debug bar coffee")
+            sys.exit()
+
+    print("\n--- DEBUG ---")
+    if options.sqlite:
+        import transaction_db
+        # Each category is read in date order out of the database's (category, date) index
+        connection = transaction_database(statements_folder, os.path.dirname(output_pdf), jobs=options.jobs, use_threads=options.threads)
+        frames = {el: transaction_db.category_spendings(connection, el) for el in debug_pd}
+        connection.close()
+    else:
+        store = update_transactions(statements_folder, os.path.dirname(output_pdf), jobs=options.jobs, use_threads=options.threads)
+        all_data = organizer.organise_data_by_category(transaction_store.spendings(store))
+        frames = {el: all_data[el].assign(amount=all_data[el]['cents'] / 100)[['date', 'place', 'amount']].sort_values(by=['date'])
+                  for el in debug_pd}
+    for el in debug_pd:
+        print(f"Content of {el} dataframe")
+        with pd.option_context('display.max_rows', None, 'display.max_columns', None):
+            print(frames[el].to_string(index=False))
+            print()
+
+
+def categorize_command(options):
+    """Print the category of the given places, or the number of spendings in each category"""
+
+    if options.places:
+        # Only the keyword matcher is needed: no pandas
+        import category
+        import matcher
+        from merchant_cache import normalize_merchant
+
+        tree_matcher = matcher.get_tree_matcher(category.Tree, category_name.MISC)
+        for place in options.places:
+            # Classified the way the statements are, see organizer.classify_cached()
+            name, sub_name = tree_matcher.classify(normalize_merchant(place))
+            print(f"{place}: {name}" + (f" / {sub_name}" if sub_name != name else ""))
+        return
+
+    import pandas as pd
+    import transaction_store
+
+    if options.sqlite:
+        import transaction_db
+        connection = transaction_database(statements_folder, os.path.dirname(output_pdf), jobs=options.jobs, use_threads=options.threads)
+        summary = transaction_db.category_totals(connection)
+        connection.close()
+    else:
+        store = update_transactions(statements_folder, os.path.dirname(output_pdf), jobs=options.jobs, use_threads=options.threads)
+        spendings = transaction_store.spendings(store)
+        summary = spendings.groupby(['category', 'sub_category'], observed=True)['amount'].agg(['count', 'sum']).sort_index()
+        summary.columns = ['spendings', 'amount']
+    with pd.option_context('display.max_rows', None):
+        print(summary.round(2).to_string())
+
+
+def stats_command(options):
+    """Print the monthly spendings of each category and their averages"""
+
+    import pandas as pd
+    import average
+    import organizer
+
+    if options.sqlite:
+        import transaction_db
+        connection = transaction_database(statements_folder, os.path.dirname(output_pdf), jobs=options.jobs, use_threads=options.threads)
+        monthly_all, _ = transaction_db.monthly_matrices(connection)
+        connection.close()
+    else:
+        store = update_transactions(statements_folder, os.path.dirname(output_pdf), jobs=options.jobs, use_threads=options.threads)
+        monthly_all, _ = monthly_matrices(store, os.path.dirname(output_pdf))
+
+    averages = {}
+    for name in monthly_all:
+        averages[name] = average.compute_averages(organizer.monthly_spending(monthly_all, name))
+    averages = pd.DataFrame({'average': {name: values['absolute'] for name, values in averages.items()},
+                             'average without extremums': {name: values['trimmed'] for name, values in averages.items()},
+                             'last 6 months': {name: values['period_values'][0] for name, values in averages.items()}})
+
+    with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', None):
+        print("Monthly spendings")
+        print(monthly_all.to_string())
+        print()
+        print("Average monthly spendings, the current month aside")
+        print(averages.to_string())
+
+
+def query_command(options):
+    """Print the spendings matching some filters, their monthly sums or their top merchants. No chart is rendered"""
+
+    import re
+    import pandas as pd
+    import query
+    import transaction_store
+
+    try:
+        if options.sqlite:
+            # Only the spendings of the date range are read, out of the database's date index
+            import transaction_db
+            connection = transaction_database(statements_folder, os.path.dirname(output_pdf), jobs=options.jobs, use_threads=options.threads)
+            index = query.DateIndex(transaction_db.spendings_between(connection, *query.period_bounds(options.start, options.end)))
+            total = transaction_db.spendings_count(connection)
+            connection.close()
+        else:
+            store = update_transactions(statements_folder, os.path.dirname(output_pdf), jobs=options.jobs, use_threads=options.threads)
+            index = query.DateIndex(transaction_store.spendings(store))
+            total = len(index)
+        rows = index.query(start=options.start, end=options.end, category=options.category, merchant=options.merchant,
+                           min_amount=options.min_amount, max_amount=options.max_amount)
+    except (ValueError, re.error) as error:
+        print(f"** ERROR ** Invalid filter: {error}")
         sys.exit()
+
+    print(f"{len(rows)} of {total} spendings match")
+    with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', None):
+        if options.monthly:
+            print(query.monthly_sums(rows).to_string())
+        elif options.top:
+            print(query.top_merchants(rows, options.top).to_string())
+        elif len(rows):
+            print(rows.to_string(index=False))
+
+
+def serve_command(options):
+    """Serve the charts and the monthly spendings on a local web dashboard"""
+
+    import dashboard
+
+    dashboard.serve(statements_folder, os.path.dirname(output_pdf), host=options.host, port=options.port,
+                    fast=options.fast_render, jobs=options.jobs, use_threads=options.threads)
+
+
+def watch_command(options):
+    """Keep the overview PDF up to date as statements are added to the statement folders"""
+
+    import watch
+
+    watch.watch(statements_folder, output_pdf, interval=options.interval, debounce=options.debounce,
+                fast=options.fast_render, jobs=options.jobs, use_threads=options.threads)
+
+
+def build_parser():
+    """Describe the command line: one sub command per task, 'report' being the default one
+
+    Returns:
+        argparse.ArgumentParser: The parser
+    """
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--jobs', type=int, default=1, metavar='N', help="parse the statements with N worker processes")
+    common.add_argument('--threads', action='store_true', help="parse the statements with threads instead of processes")
+    common.add_argument('--profile', action='store_true', help="print the time, rows and peak memory of each stage")
+    common.add_argument('--profile-out', metavar='FILE', help="also dump cProfile stats in FILE")
+
+    database = argparse.ArgumentParser(add_help=False)
+    database.add_argument('--sqlite', action='store_true',
+                          help="keep the spendings in a SQLite database (transactions.sqlite) instead of transactions.pkl and query it")
+
+    rendering = argparse.ArgumentParser(add_help=False)
+    rendering.add_argument('--fast-render', action='store_true',
+                           help="batch the bar labels and only draw as many labels and ticks as the charts width can hold")
+
+    parser = argparse.ArgumentParser(description="Overview of the monthly spendings of bank statements")
+    commands = parser.add_subparsers(dest='command', metavar='command')
+
+    report = commands.add_parser('report', parents=[common, database, rendering], help="write the overview PDF (default)")
+    report.add_argument('--chunksize', type=int, default=0, metavar='N',
+                        help="streaming mode: read the statements N lines at a time and only keep their monthly totals in memory")
+    report.add_argument('--render-jobs', type=int, default=1, metavar='N',
+                        help="render the PDF pages in N worker processes. Pages are then images instead of vector graphics")
+    report.add_argument('--batch', metavar='FILE', help="generate the report of each profile listed in FILE")
+    report.add_argument('--batch-jobs', type=int, default=1, metavar='N', help="generate N batch reports at a time")
+    report.set_defaults(run=report_command)
+
+    debug = commands.add_parser('debug', parents=[common, database], help="print the spendings of some categories")
+    debug.add_argument('categories', nargs='*', metavar='category',
+                       help=f"{', '.join(DEBUG_CATEGORIES)} or all (default: {category_name.MISC})")
+    debug.set_defaults(run=debug_command)
+
+    categorize = commands.add_parser('categorize', parents=[common, database],
+                                     help="print the category of some places, or the spendings of each category")
+    categorize.add_argument('places', nargs='*', metavar='place', help="i.e: \"TIM HORTONS #0335 KAMLOOPS BC\"")
+    categorize.set_defaults(run=categorize_command)
+
+    stats = commands.add_parser('stats', parents=[common, database], help="print the monthly spendings and their averages")
+    stats.set_defaults(run=stats_command)
+
+    serve = commands.add_parser('serve', parents=[common, rendering], help="serve the charts on a local web dashboard")
+    serve.add_argument('--host', default='127.0.0.1', help="address to listen on (default: %(default)s)")
+    serve.add_argument('--port', type=int, default=8000, help="port to listen on (default: %(default)s)")
+    serve.set_defaults(run=serve_command)
+
+    watch = commands.add_parser('watch', parents=[common, rendering], help="update the overview PDF as statements are added")
+    watch.add_argument('--interval', type=float, default=2.0, metavar='SECONDS',
+                       help="seconds between two polls of the statement folders (default: %(default)s)")
+    watch.add_argument('--debounce', type=float, default=1.0, metavar='SECONDS',
+                       help="seconds the statements must stay unchanged before being read (default: %(default)s)")
+    watch.set_defaults(run=watch_command)
+
+    query = commands.add_parser('query', parents=[common, database], help="print the spendings matching some filters")
+    query.add_argument('--from', dest='start', metavar='DATE', help="first day, month or year, i.e: 2020-03-15, 2020-03 or 2020")
+    query.add_argument('--to', dest='end', metavar='DATE', help="last day, month or year, included")
+    query.add_argument('--category', help="category or sub category, i.e: coffee or carshare")
+    query.add_argument('--merchant', metavar='PATTERN', help="regular expression searched in the place, case insensitive")
+    query.add_argument('--min', dest='min_amount', type=float, metavar='AMOUNT', help="smallest amount")
+    query.add_argument('--max', dest='max_amount', type=float, metavar='AMOUNT', help="largest amount")
+    output = query.add_mutually_exclusive_group()
+    output.add_argument('--monthly', action='store_true', help="print the monthly sums instead of the spendings")
+    output.add_argument('--top', type=int, metavar='N', help="print the N merchants spent the most at instead of the spendings")
+    query.set_defaults(run=query_command)
+
+    return parser
+
+
+def main(argv):
+    # Without a command, i.e: ./compute.py --jobs 4, the report is generated. Only the first argument can be the
+    # command: an option value may be a command name, i.e: ./compute.py --profile-out stats
+    if not argv or argv[0] not in COMMANDS + ['-h', '--help']:
+        argv = ['report'] + argv
+    options = build_parser().parse_args(argv)
+
+    profile = options.profile or options.profile_out is not None
+    if profile:
+        import instrument
+        instrument.enable()
+    if options.profile_out:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    # Merchants already categorised by previous runs are not matched against category.py again
+    uses_merchant_cache = not (options.command == 'categorize' and options.places)
+    if uses_merchant_cache:
+        import organizer
+        organizer.merchant_cache.load(category_cache_file)
+
     try:
-        tmp_list_credit_card = []
-        for file in os.listdir(credit_card_statement_folder):
-            if file.lower().endswith('.csv'):
-                csv_credit_card_file = credit_card_statement_folder + '/' + file
-                print(f"Read CSV file {file}...")
-                # Extract csv into dataframe, handle each bank statement accordingly
-                tmp_list_credit_card.append(sh.parse_statement(csv_credit_card_file))
-    except FileNotFoundError:
-        print('** ERROR ** File {} not found'.format(csv_credit_card_file))
+        options.run(options)
+    except FileNotFoundError as error:
+        print(f"** ERROR ** {error}")
         sys.exit()
 
-    all_spending_df = pd.concat(tmp_list_credit_card, axis=0, ignore_index=True, sort=False)
-
-    # credit_card_data = organise_data_by_category(credit_card_spending_df)
-    all_data = organizer.organise_data_by_category(all_spending_df)
-
-    monthly_groceries = organizer.extract_monthly_spending_by_category(all_data, category_name.GROCERIES)
-    monthly_transport = organizer.extract_monthly_spending_by_category(all_data, category_name.TRANSPORT)
-    monthly_restaurant = organizer.extract_monthly_spending_by_category(all_data, category_name.RESTAURANT)
-    monthly_coffee = organizer.extract_monthly_spending_by_category(all_data, category_name.COFFEE)
-    monthly_bar = organizer.extract_monthly_spending_by_category(all_data, category_name.BAR)
-    monthly_misc = organizer.extract_monthly_spending_by_category(all_data, category_name.MISC)
-    monthly_bills = organizer.extract_monthly_spending_by_category(all_data, category_name.BILLS)
-
-    transport_data = organizer.organise_transport_by_sub_cat(all_data[category_name.TRANSPORT])
-    monthly_transport_carshare = organizer.extract_monthly_spending_by_category(transport_data, category_name.TR_CARSHARE)
-    monthly_transport_rental = organizer.extract_monthly_spending_by_category(transport_data, category_name.TR_RENTAL)
-    monthly_transport_cab = organizer.extract_monthly_spending_by_category(transport_data, category_name.TR_CAB)
-    monthly_transport_translink = organizer.extract_monthly_spending_by_category(transport_data, category_name.TR_TRANSLINK)
-    monthly_transport_misc = organizer.extract_monthly_spending_by_category(transport_data, category_name.TR_MISC)
-    monthly_transport_car = organizer.extract_monthly_spending_by_category(transport_data, category_name.TR_CAR)
-
-    monthly_spending = [monthly_bills, monthly_groceries, monthly_transport, monthly_restaurant,
-                        monthly_coffee, monthly_bar, monthly_misc]
-
-    monthly_transport = [monthly_transport_carshare, monthly_transport_rental, monthly_transport_cab, monthly_transport_translink, monthly_transport_car]  # not interested about misc
-
-    figures = []
-    figures.append(render.monthly_bar_by_cat(monthly_spending[1:]))  # Do not plot bills expenses
-    figures.append(render.monthly_bar_stacked(monthly_spending))
-    figures.append(render.average_pie(monthly_spending))
-    figures.append(render.monthly_bar_by_cat(monthly_transport, useAbsoluteAvg=True))
-    # figures.append(render_monthly_bar_stacked(monthly_transport, useAbsoluteAvg=True, title="Month by month transport"))
-
-    doc = PdfPages(output_pdf)
-    for figure in figures:
-        figure.savefig(doc, format='pdf')
-    doc.close()
-    print("Output PDF document: {}".format(output_pdf))
+    if uses_merchant_cache:
+        organizer.merchant_cache.save(category_cache_file)
+        print(f"Category cache: {organizer.merchant_cache.hits} hits, {organizer.merchant_cache.misses} misses")
 
-    if "debug_pd" in locals() and len(debug_pd) > 0:
-        for el in debug_pd:
-            print(f"Content of {el} dataframe")
-            with pd.option_context('display.max_rows', None, 'display.max_columns', None):
-                print(all_data[el].sort_values(by=['date']).to_string(index=False))
-                print()
+    if options.profile_out:
+        profiler.disable()
+        profiler.dump_stats(options.profile_out)
+        print(f"cProfile stats written in {options.profile_out}, i.e: python3 -m pstats {options.profile_out}")
+    if profile:
+        print()
+        print(instrument.summary())
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
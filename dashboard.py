@@ -0,0 +1,261 @@
+#! /usr/bin/env python3
+
+import io
+import os
+import json
+import hashlib
+from datetime import date
+from http.server import HTTPServer, BaseHTTPRequestHandler
+import matplotlib.pyplot as plt
+import pandas as pd
+import fixed_expenses
+import matrix_cache
+import overview
+import render
+import transaction_store
+
+CONTENT_TYPES = {'png': 'image/png',
+                 'svg': 'image/svg+xml',
+                 'json': 'application/json',
+                 'html': 'text/html; charset=utf-8'}
+
+
+def page_fingerprint(page):
+    """Fingerprint what a report page is drawn from: a page whose fingerprint did not change needs no new drawing
+
+    Args:
+        page (tuple): (builder name, monthly spendings, keyword arguments), see render.build_page()
+
+    Returns:
+        str: The fingerprint
+    """
+
+    builder, _df_list, kwargs = page
+    # The averages and the "NO DATA" charts depend on today's month
+    digest = hashlib.sha256(repr((builder, sorted(kwargs.items()), date.today().strftime('%Y-%m'))).encode())
+    for el in _df_list:
+        digest.update(el.name.encode())
+        digest.update(pd.util.hash_pandas_object(el).values.tobytes())
+    return digest.hexdigest()
+
+
+def matrix_json(matrix):
+    """Serialise a month x category matrix
+
+    Args:
+        matrix (pandas.core.frame.DataFrame): The matrix, see organizer.build_monthly_matrix()
+
+    Returns:
+        dict: [months] = 'YYYY-MM' of each row; [amounts] = {category: amount of each month}
+    """
+
+    return {'months': [month.strftime('%Y-%m') for month in matrix.index],
+            'amounts': {name: [round(float(amount), 2) for amount in matrix[name]] for name in matrix}}
+
+
+class Dashboard:
+    """Keep the spendings of a statements folder in memory and serve their charts
+
+    The transaction store and the monthly matrices stay loaded between requests, and every rendered chart is kept
+    along with the fingerprint of the data it was drawn from. When a statement is added or modified, the spendings are
+    updated incrementally and only the charts whose data changed are drawn again, the next time they are requested.
+    """
+
+    def __init__(self, statements_folder, data_folder, fast=False, jobs=1, use_threads=False):
+        """Build the dashboard, nothing is read until the first refresh
+
+        Args:
+            statements_folder (str): Path to the statements folder, holding CreditCard and optionally Checking
+            data_folder (str): Folder the transaction store and the monthly spendings cache are kept in
+            fast (bool, optional): Render the charts with the fast rendering, see render.build_page(). Defaults to False.
+            jobs (int, optional): Number of statements parsed at the same time. Defaults to 1.
+            use_threads (bool, optional): Parse with threads instead of processes. Defaults to False.
+        """
+
+        self.statements_folder = statements_folder
+        self.store_file = data_folder + "/transactions.pkl"
+        self.cache_file = data_folder + "/monthly_cache.pkl"
+        self.store = None
+        self.cache = None
+        self.signature = None
+        self.pages = {}  # [chart name] = (fingerprint, page)
+        self.data = {}  # [data name] = (fingerprint, JSON bytes)
+        self.charts = {}  # [(chart name, format)] = (fingerprint, image bytes)
+        self.figures = {}  # [chart name] = (fingerprint, figure): kept to draw the next version of the chart into
+        self.fast = fast
+        self.jobs = jobs
+        self.use_threads = use_threads
+
+    def statements_signature(self):
+        """Stat the statements and the fixed expenses schedule: the spendings must be updated when this signature changes
+
+        Returns:
+            tuple: (path, size, modification time) of each file, and today's month
+        """
+
+        csv_files, checking_files = overview.statement_files(self.statements_folder)
+        files = csv_files + checking_files + [fixed_expenses.schedule_file]
+        stats = tuple((file, os.stat(file).st_size, os.stat(file).st_mtime) if os.path.exists(file) else (file,) for file in files)
+        return stats, date.today().strftime('%Y-%m')
+
+    def refresh(self, signature=None):
+        """Update the spendings and the monthly matrices if a statement changed since the last refresh
+
+        Args:
+            signature (tuple, optional): The statements signature if it was just taken. Defaults to None.
+
+        Returns:
+            bool: True if the statements changed
+        """
+
+        signature = signature or self.statements_signature()
+        if signature == self.signature:
+            return False
+
+        if self.store is None:
+            self.store = transaction_store.load_store(self.store_file)
+            self.cache = matrix_cache.load_cache(self.cache_file)
+
+        csv_files, checking_files = overview.statement_files(self.statements_folder)
+        changed = transaction_store.update_store(self.store, csv_files + checking_files, jobs=self.jobs, use_threads=self.use_threads)
+        recategorised = transaction_store.categorise_store(self.store)
+        if changed or recategorised or self.signature is None:
+            transaction_store.save_store(self.store, self.store_file)
+        monthly_all, monthly_all_transport = matrix_cache.monthly_matrices(self.cache, self.store)
+        matrix_cache.save_cache(self.cache, self.cache_file)
+
+        pages = overview.report_pages(monthly_all, monthly_all_transport)
+        self.pages = {name: (page_fingerprint(page), page) for name, page in zip(overview.PAGE_NAMES, pages)}
+        for name, matrix in (('monthly', monthly_all), ('transport', monthly_all_transport)):
+            content = json.dumps(matrix_json(matrix)).encode()
+            self.data[name] = (hashlib.sha256(content).hexdigest(), content)
+
+        if self.charts:
+            outdated = {name for (name, _), (fingerprint, _) in self.charts.items() if fingerprint != self.pages[name][0]}
+            print(f"Statements changed, {len(outdated)} charts to render again")
+        self.signature = signature
+        return True
+
+    def chart(self, name, image_format):
+        """Get a chart, rendering it only if its data changed since it was last rendered
+
+        Args:
+            name (str): One of overview.PAGE_NAMES
+            image_format (str): 'png' or 'svg'
+
+        Raises:
+            KeyError: If there is no such chart
+
+        Returns:
+            tuple: (fingerprint, image bytes)
+        """
+
+        fingerprint, page = self.pages[name]
+        cached = self.charts.get((name, image_format))
+        if cached is not None and cached[0] == fingerprint:
+            return cached
+
+        print(f"Render the {name} chart as {image_format}")
+        built = self.figures.get(name)
+        if built is None or built[0] != fingerprint:
+            built = (fingerprint, render.build_page(page, fig=built and built[1], fast=self.fast))
+            self.figures[name] = built
+        buffer = io.BytesIO()
+        built[1].savefig(buffer, format=image_format)
+        self.charts[(name, image_format)] = (fingerprint, buffer.getvalue())
+        return self.charts[(name, image_format)]
+
+    def index(self):
+        """The dashboard's HTML page: every chart, and links to the JSON data
+
+        Returns:
+            tuple: (fingerprint, HTML bytes)
+        """
+
+        charts = ''.join(f'<h2>{name}</h2><a href="/charts/{name}.svg"><img src="/charts/{name}.png" width="100%"></a>\n'
+                         for name in overview.PAGE_NAMES)
+        data = ' '.join(f'<a href="/data/{name}.json">{name}.json</a>' for name in self.data)
+        content = f"<!DOCTYPE html>\n<html><head><title>Spendings</title></head><body>\n{charts}<p>{data}</p>\n</body></html>\n".encode()
+        return hashlib.sha256(content).hexdigest(), content
+
+
+class DashboardHandler(BaseHTTPRequestHandler):
+    """Serve the dashboard: / is the HTML page, /charts/<name>.<png|svg> the charts and /data/<name>.json the monthly
+    matrices. Every response has an ETag, a client already holding the content gets a 304 Not Modified
+    """
+
+    def do_GET(self):
+        dashboard = self.server.dashboard
+        path = self.path.split('?', 1)[0]
+        try:
+            dashboard.refresh()
+            if path == '/':
+                fingerprint, content = dashboard.index()
+                extension = 'html'
+            else:
+                folder, _, file = path.lstrip('/').partition('/')
+                name, _, extension = file.rpartition('.')
+                if folder == 'charts' and extension in ('png', 'svg'):
+                    fingerprint, content = dashboard.chart(name, extension)
+                elif folder == 'data' and extension == 'json':
+                    fingerprint, content = dashboard.data[name]
+                else:
+                    raise KeyError(path)
+        except KeyError:
+            self.send_error(404)
+            return
+        except (OSError, ValueError) as error:
+            self.send_error(500, explain=str(error))
+            return
+
+        etag = f'"{fingerprint}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPES[extension])
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')  # always revalidated: statements may change
+        self.end_headers()
+        self.wfile.write(content)
+
+
+def serve(statements_folder, data_folder, host='127.0.0.1', port=8000, fast=False, jobs=1, use_threads=False):
+    """Serve the dashboard until interrupted (Ctrl-C)
+
+    Requests are handled one at a time: charts are drawn with matplotlib, which is not thread safe.
+
+    Args:
+        statements_folder (str): Path to the statements folder, holding CreditCard and optionally Checking
+        data_folder (str): Folder the transaction store and the monthly spendings cache are kept in
+        host (str, optional): Address to listen on. Defaults to '127.0.0.1'.
+        port (int, optional): Port to listen on. Defaults to 8000.
+        fast (bool, optional): Render the charts with the fast rendering, see render.build_page(). Defaults to False.
+        jobs (int, optional): Number of statements parsed at the same time. Defaults to 1.
+        use_threads (bool, optional): Parse with threads instead of processes. Defaults to False.
+
+    Raises:
+        FileNotFoundError: If the statements folder does not exist
+    """
+
+    plt.switch_backend('Agg')  # charts are only rendered into images
+    # To get rid of pandas' matplotlib "FutureWarning"
+    from pandas.plotting import register_matplotlib_converters
+    register_matplotlib_converters()
+
+    dashboard = Dashboard(statements_folder, data_folder, fast=fast, jobs=jobs, use_threads=use_threads)
+    dashboard.refresh()  # fail early if the statements cannot be read
+
+    server = HTTPServer((host, port), DashboardHandler)
+    server.dashboard = dashboard
+    print(f"Dashboard served on http://{host}:{server.server_port}/ (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print()
+    finally:
+        server.server_close()
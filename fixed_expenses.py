@@ -0,0 +1,82 @@
+#! /usr/bin/env python3
+
+import os
+import json
+import numpy as np
+import pandas as pd
+
+# Fixed expenses (rent, insurance...) accounted as the bills of each month, instead of the bills found in the statements
+schedule_file = os.path.dirname(os.path.abspath(__file__)) + "/fixed_expenses.json"
+
+
+def month_number(month):
+    """Number a month, so that consecutive months have consecutive numbers
+
+    Args:
+        month (str): The month, 'YYYY-MM'
+
+    Returns:
+        int: Number of months since January 1970
+    """
+
+    if not isinstance(month, str) or len(month) != 7:
+        raise ValueError(f"'{month}' is not a YYYY-MM month")
+    return int(np.datetime64(month, 'M').astype(np.int64))
+
+
+def load_schedule(path=None):
+    """Load the fixed expenses schedule
+
+    The schedule is a JSON list of {"label": str, "amount": number, "start": "YYYY-MM", "end": "YYYY-MM" or null}
+    items, an expense being due every month from its start until its end (included), or forever if it has no end.
+
+    Args:
+        path (str, optional): Path to the schedule. Defaults to schedule_file.
+
+    Returns:
+        pandas.core.frame.DataFrame: One row per item: [label, amount, start, end], start and end being month numbers
+    """
+
+    path = path or schedule_file
+    if not os.path.exists(path):
+        print(f"No fixed expenses schedule {os.path.basename(path)}, bills will be accounted as 0")
+        items = []
+    else:
+        with open(path, 'r') as file:
+            items = json.load(file)
+
+    try:
+        labels = [str(item['label']) for item in items]
+        amounts = [float(item['amount']) for item in items]
+        starts = [month_number(item['start']) for item in items]
+        ends = [month_number(item['end']) if item.get('end') else np.iinfo(np.int64).max for item in items]
+    except (KeyError, TypeError, ValueError) as error:
+        raise ValueError(f"Invalid fixed expenses schedule {path}: {error}")
+
+    return pd.DataFrame({'label': labels,
+                         'amount': np.array(amounts, dtype=float),
+                         'start': np.array(starts, dtype=np.int64),
+                         'end': np.array(ends, dtype=np.int64)})
+
+
+def expand_schedule(schedule, months):
+    """Expand the schedule into the amount due for each label each month, without looping over the months
+
+    Args:
+        schedule (pandas.core.frame.DataFrame): The schedule, see load_schedule()
+        months (pandas.core.indexes.datetimes.DatetimeIndex): First day of each month
+
+    Returns:
+        pandas.core.frame.DataFrame: [index] = months; [columns] = labels
+    """
+
+    month_numbers = months.values.astype('datetime64[M]').astype(np.int64)
+    labels, label_codes = np.unique(schedule['label'].values.astype(str), return_inverse=True)
+
+    # months x items: is the item due this month
+    due = (month_numbers[:, None] >= schedule['start'].values) & (month_numbers[:, None] <= schedule['end'].values)
+    # items x labels: amount of the item under its label
+    amounts = np.zeros((len(schedule), len(labels)))
+    amounts[np.arange(len(schedule)), label_codes] = schedule['amount'].values
+
+    return pd.DataFrame(due.astype(float) @ amounts, index=months, columns=labels)
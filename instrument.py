@@ -0,0 +1,139 @@
+#! /usr/bin/env python3
+
+import time
+import functools
+import tracemalloc
+import contextlib
+import pandas as pd
+
+# Instrumentation is off by default: instrumented functions then cost a single flag check
+enabled = False
+records = []
+_peaks = []  # peak memory of the enclosing stages, see stage()
+
+
+def enable(measure_memory=True):
+    """Start recording the stages
+
+    Args:
+        measure_memory (bool, optional): Also record each stage's peak memory with tracemalloc, which slows down the stages. Defaults to True.
+    """
+
+    global enabled
+    enabled = True
+    if measure_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    global enabled
+    enabled = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def reset():
+    records.clear()
+
+
+def count_rows(result):
+    """Count the rows of a stage's result: dataframes, dictionaries or lists of dataframes
+
+    Args:
+        result (object): What the stage returned
+
+    Returns:
+        int: The number of rows, None if the result does not hold any dataframe
+    """
+
+    if isinstance(result, pd.DataFrame):
+        return len(result)
+    if isinstance(result, dict):
+        result = list(result.values())
+    if isinstance(result, (list, tuple)):
+        counts = [count for count in map(count_rows, result) if count is not None]
+        return sum(counts) if counts else None
+    return None
+
+
+@contextlib.contextmanager
+def stage(name, rows=None):
+    """Record the wall time, CPU time and peak memory of the enclosed code
+
+    Args:
+        name (str): The stage's name
+        rows (int, optional): Number of rows the stage handled. The record is yielded so that it can be set afterwards. Defaults to None.
+
+    Yields:
+        dict: The stage's record
+    """
+
+    record = {'stage': name, 'wall': 0.0, 'cpu': 0.0, 'rows': rows, 'peak_memory': None}
+    if not enabled:
+        yield record
+        return
+
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        # tracemalloc has a single peak counter: keep the peak reached so far by the enclosing stages before resetting it
+        start_memory, peak = tracemalloc.get_traced_memory()
+        if _peaks:
+            _peaks[-1] = max(_peaks[-1], peak)
+        _peaks.append(0)
+        tracemalloc.reset_peak()
+
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        record['wall'] = time.perf_counter() - wall
+        record['cpu'] = time.process_time() - cpu
+        if tracing:
+            peak = max(tracemalloc.get_traced_memory()[1], _peaks.pop())
+            record['peak_memory'] = max(peak - start_memory, 0)
+            if _peaks:
+                _peaks[-1] = max(_peaks[-1], peak)
+        records.append(record)
+
+
+def profiled(func):
+    """Decorator recording every call of a function as a stage. Rows are counted out of the returned value"""
+
+    name = f"{func.__module__}.{func.__name__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not enabled:
+            return func(*args, **kwargs)
+        with stage(name) as record:
+            result = func(*args, **kwargs)
+            record['rows'] = count_rows(result)
+        return result
+
+    return wrapper
+
+
+def summary():
+    """Summarize the recorded stages, one line per stage name, in the order they first completed
+
+    Returns:
+        str: The summary table
+    """
+
+    stages = {}
+    for record in records:
+        total = stages.setdefault(record['stage'], {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'rows': None, 'peak_memory': None})
+        total['calls'] += 1
+        total['wall'] += record['wall']
+        total['cpu'] += record['cpu']
+        if record['rows'] is not None:
+            total['rows'] = (total['rows'] or 0) + record['rows']
+        if record['peak_memory'] is not None:
+            total['peak_memory'] = max(total['peak_memory'] or 0, record['peak_memory'])
+
+    lines = [f"{'Stage':<50} {'Calls':>6} {'Wall (s)':>10} {'CPU (s)':>10} {'Rows':>10} {'Peak (MB)':>10}"]
+    for name, total in stages.items():
+        rows = '' if total['rows'] is None else total['rows']
+        peak = '' if total['peak_memory'] is None else f"{total['peak_memory'] / 2**20:.1f}"
+        lines.append(f"{name:<50} {total['calls']:>6} {total['wall']:>10.3f} {total['cpu']:>10.3f} {rows:>10} {peak:>10}")
+    return '\n'.join(lines)
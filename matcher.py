@@ -0,0 +1,240 @@
+#! /usr/bin/env python3
+
+import re
+from collections import deque
+from functools import lru_cache
+
+# A keyword containing any of these characters is a regular expression, otherwise it is a plain substring
+REGEX_CHARACTERS = re.compile(r'[.^$*+?{}\[\]\\|()]')
+
+
+def is_literal(keyword):
+    """Tells if a category keyword is a plain substring or a regular expression
+
+    Args:
+        keyword (str): A keyword of category.py
+
+    Returns:
+        bool: True if the keyword has no regular expression syntax
+    """
+
+    return REGEX_CHARACTERS.search(keyword) is None
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton: finds all the keywords appearing in a text in a single pass over the text
+
+    Each keyword holds a priority (the lower the better), a search returns the best priority among the keywords found.
+    """
+
+    def __init__(self, keywords):
+        """Build the automaton
+
+        Args:
+            keywords (dict): [key] = keyword; [value] = priority (int >= 0)
+        """
+
+        self._goto = [{}]
+        self._fail = [0]
+        self._priority = [None]
+
+        for keyword, priority in keywords.items():
+            node = 0
+            for char in keyword:
+                child = self._goto[node].get(char)
+                if child is None:
+                    child = len(self._goto)
+                    self._goto[node][char] = child
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._priority.append(None)
+                node = child
+            self._priority[node] = _best(self._priority[node], priority)
+
+        # Breadth first: the failure link of a node is the longest suffix of its keyword that is also a prefix of a keyword
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                # Keywords ending at the failure node also end here
+                self._priority[child] = _best(self._priority[child], self._priority[self._fail[child]])
+
+    def __len__(self):
+        return len(self._goto)
+
+    def search(self, text):
+        """Find the best priority among the keywords appearing in text
+
+        Args:
+            text (str): The text to search, lower case like the keywords
+
+        Returns:
+            int: The best priority found, None if no keyword appears in text
+        """
+
+        goto, fail, priorities = self._goto, self._fail, self._priority
+        best = None
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            priority = priorities[node]
+            if priority is not None and (best is None or priority < best):
+                best = priority
+                if best == 0:  # cannot do any better
+                    break
+        return best
+
+
+def _best(priority, other):
+    if priority is None:
+        return other
+    if other is None:
+        return priority
+    return min(priority, other)
+
+
+class CategoryMatcher:
+    """Classify places against category lists in priority order
+
+    The plain substring keywords of all the categories are searched at once with a KeywordAutomaton, the few regular
+    expression keywords are compiled per category and only tried for the categories with a better priority than the
+    best plain substring found.
+    """
+
+    def __init__(self, categories, default):
+        """Build the matcher
+
+        Args:
+            categories (list): List of (category name, category list) tuples, ordered by priority
+            default (str): Category name given to the places matching none of the categories
+        """
+
+        self.names = [name for name, _ in categories] + [default]
+        literals = {}
+        self.regexes = []
+        for priority, (_, keywords) in enumerate(categories):
+            regex_keywords = []
+            for keyword in keywords:
+                if is_literal(keyword):
+                    literals.setdefault(keyword.lower(), priority)
+                else:
+                    regex_keywords.append(keyword)
+            self.regexes.append(re.compile('|'.join('(?:{})'.format(keyword) for keyword in regex_keywords), re.IGNORECASE)
+                                if regex_keywords else None)
+        self.automaton = KeywordAutomaton(literals)
+
+    def priority(self, place):
+        """Find the priority of the category a place belongs to
+
+        Args:
+            place (str): The 'place' field of a spending
+
+        Returns:
+            int: Index of the category in the list given to the matcher, len(categories) for the default category
+        """
+
+        text = place.lower()
+        best = self.automaton.search(text)
+        best = len(self.regexes) if best is None else best
+        for priority in range(best):
+            regex = self.regexes[priority]
+            if regex is not None and regex.search(text):
+                return priority
+        return best
+
+    def classify(self, place):
+        """Find the category a place belongs to
+
+        Args:
+            place (str): The 'place' field of a spending
+
+        Returns:
+            str: The name of the first category (in priority order) matching the place, the default category otherwise
+        """
+
+        return self.names[self.priority(place)]
+
+
+def flatten_tree(tree, default):
+    """Flatten a category tree into its leaves, ordered by category priority then sub category priority
+
+    Args:
+        tree (list): (category name, category list, [(sub category name, sub category list)], default sub category) tuples, ordered by priority
+        default (str): Category name given to the places matching none of the categories, it is its own sub category
+
+    Returns:
+        tuple: (labels, leaves) labels[i] = (category name, sub category name) of the i-th leaf; leaves[i] = its keywords.
+            The last label is the default one, it has no leaf
+    """
+
+    labels = []
+    leaves = []
+    for name, keywords, sub_categories, default_sub_category in tree:
+        for sub_name, sub_keywords in sub_categories:
+            labels.append((name, sub_name))
+            leaves.append(list(sub_keywords))
+        if keywords:
+            # A category without sub categories is its own sub category
+            labels.append((name, default_sub_category if sub_categories else name))
+            leaves.append(list(keywords))
+    labels.append((default, default))
+    return labels, leaves
+
+
+class TreeMatcher:
+    """Classify places against a category tree (see category.Tree) in a single pass
+
+    The tree is flattened into a list of leaves ordered by category priority then sub category priority: the first
+    matching leaf gives both the category and the sub category of a place.
+    """
+
+    def __init__(self, tree, default):
+        """Build the matcher
+
+        Args:
+            tree (list): (category name, category list, [(sub category name, sub category list)], default sub category) tuples, ordered by priority
+            default (str): Category name given to the places matching none of the categories, it is its own sub category
+        """
+
+        self.labels, leaves = flatten_tree(tree, default)
+        self.matcher = CategoryMatcher(list(enumerate(leaves)), None)
+
+    def classify(self, place):
+        """Find the category and sub category a place belongs to
+
+        Args:
+            place (str): The 'place' field of a spending
+
+        Returns:
+            tuple: (category name, sub category name)
+        """
+
+        return self.labels[self.matcher.priority(place)]
+
+
+@lru_cache(maxsize=None)
+def _tree_matcher(tree, default):
+    return TreeMatcher(tree, default)
+
+
+def get_tree_matcher(tree, default):
+    """Get the matcher of the given category tree. Matchers are built only once
+
+    Args:
+        tree (list): Category tree, see category.Tree
+        default (str): Category name given to the places matching none of the categories
+
+    Returns:
+        TreeMatcher: The matcher
+    """
+
+    return _tree_matcher(tuple((name, tuple(keywords), tuple((sub_name, tuple(sub_keywords)) for sub_name, sub_keywords in sub_categories),
+                                default_sub_category)
+                               for name, keywords, sub_categories, default_sub_category in tree), default)
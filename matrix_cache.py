@@ -0,0 +1,156 @@
+#! /usr/bin/env python3
+
+import os
+import hashlib
+from datetime import date
+import numpy as np
+import pandas as pd
+import fixed_expenses
+import instrument
+import organizer
+from merchant_cache import keywords_fingerprint
+
+# Bump when the layout of the cache changes, older caches are then ignored
+CACHE_VERSION = 1
+
+
+def fixed_expenses_fingerprint():
+    """Fingerprint the fixed expenses schedule the bills are accounted with
+
+    Returns:
+        str: A hash that changes as soon as the schedule changes
+    """
+
+    schedule = fixed_expenses.load_schedule()
+    return hashlib.sha256(schedule.to_json(orient='records').encode()).hexdigest()
+
+
+def empty_cache():
+    """Create a cache without any monthly spending
+
+    Returns:
+        dict: [keywords], [fixed_expenses] = fingerprints of the rules the cache has been computed with;
+            [sources] = {statement path: hash}; [source_months] = {statement path: months with spendings, 'YYYY-MM'};
+            [totals], [transport_totals] = monthly totals; [month] = month the matrices have been built in;
+            [matrix], [transport_matrix] = the month x category matrices of the report
+    """
+
+    return {'version': CACHE_VERSION,
+            'keywords': None,
+            'fixed_expenses': None,
+            'sources': {},
+            'source_months': {},
+            'totals': organizer.monthly_totals({}),
+            'transport_totals': organizer.monthly_totals({}),
+            'month': None,
+            'matrix': None,
+            'transport_matrix': None}
+
+
+def load_cache(cache_file):
+    """Load the cache saved by save_cache()
+
+    Args:
+        cache_file (str): Path to the cache
+
+    Returns:
+        dict: The cache. An empty one if it does not exist, is unreadable or has been written by another version
+    """
+
+    if not os.path.exists(cache_file):
+        return empty_cache()
+    try:
+        cache = pd.read_pickle(cache_file)
+    except Exception:
+        print(f"Could not read {os.path.basename(cache_file)}, monthly spendings will be computed again")
+        return empty_cache()
+
+    if not isinstance(cache, dict) or cache.get('version') != CACHE_VERSION:
+        return empty_cache()
+    return cache
+
+
+def save_cache(cache, cache_file):
+    """Write the cache on disk
+
+    Args:
+        cache (dict): The cache to save
+        cache_file (str): Path to the cache
+    """
+
+    tmp_file = cache_file + '.tmp'
+    pd.to_pickle(cache, tmp_file)
+    os.replace(tmp_file, cache_file)
+
+
+def _months(transactions):
+    return transactions['date'].values.astype('datetime64[M]')
+
+
+def _replace_months(totals, months, new_totals):
+    # Months and categories left without any spending disappear, as they would when computing everything again
+    totals = organizer.add_monthly_totals(totals[~np.isin(totals.index.values.astype('datetime64[M]'), months)], new_totals)
+    totals = totals.loc[(totals != 0).any(axis=1), (totals != 0).any(axis=0)]
+    return totals
+
+
+@instrument.profiled
+def monthly_matrices(cache, store):
+    """Get the month x category matrices of the spendings of the transaction store, recomputing as little as possible
+
+    - Nothing changed: the cached matrices are returned as is, nothing is summed again
+    - Only the fixed expenses rules or the current month changed: the matrices are rebuilt from the cached totals
+    - Some statements changed: only the months these statements have (or used to have) spendings in are summed again
+    - category.py changed: only the months having spendings that changed category are summed again, see
+      transaction_store.categorise_store()
+
+    Args:
+        cache (dict): The cache, updated in place
+        store (dict): The categorised transaction store, see transaction_store.categorise_store()
+
+    Returns:
+        tuple: The month x category matrix of the categories and the one of the transport sub categories
+    """
+
+    keywords = keywords_fingerprint()
+    fixed_expenses = fixed_expenses_fingerprint()
+    sources = {source: signature['hash'] for source, signature in store['files'].items()}
+    # A statement whose spendings are flagged as duplicates differently must be summed again too
+    duplicates = store['transactions'][store['transactions']['duplicate'].values.astype(bool)]
+    for source, rows in duplicates.groupby('source'):
+        sources[source] += ':' + hashlib.sha256(pd.util.hash_pandas_object(rows[['date', 'amount']], index=False).values).hexdigest()
+    month = date.today().replace(day=1)
+
+    if cache['keywords'] == keywords and cache['sources'] == sources:
+        if cache['fixed_expenses'] == fixed_expenses and cache['month'] == month:
+            print("Monthly spendings are up to date")
+            return cache['matrix'], cache['transport_matrix']
+    else:
+        transactions = store['transactions']
+        months = _months(transactions)
+        kept = ~transactions['duplicate'].values.astype(bool)
+
+        if cache['keywords'] is not None and cache['keywords'] in (keywords, store['recategorised']['keywords']):
+            changed = {source for source in set(sources) | set(cache['sources']) if sources.get(source) != cache['sources'].get(source)}
+            affected = set() if cache['keywords'] == keywords else set(store['recategorised']['months'])
+            for source in changed:
+                affected.update(cache['source_months'].get(source, []))
+            affected.update(np.datetime_as_string(np.unique(months[transactions['source'].isin(changed).values])))
+            affected = np.array(sorted(affected), dtype='datetime64[M]')
+            print(f"Recompute the monthly spendings of {len(affected)} months")
+
+            totals, transport_totals = organizer.report_totals(organizer.categorise(transactions[np.isin(months, affected) & kept]))
+            totals = _replace_months(cache['totals'], affected, totals)
+            transport_totals = _replace_months(cache['transport_totals'], affected, transport_totals)
+        else:
+            print("Compute the monthly spendings of all the statements")
+            totals, transport_totals = organizer.report_totals(organizer.categorise(transactions[kept]))
+
+        cache.update(keywords=keywords, sources=sources, totals=totals, transport_totals=transport_totals,
+                     source_months={source: list(np.datetime_as_string(np.unique(months[indices])))
+                                    for source, indices in transactions.groupby('source').indices.items()})
+
+    cache.update(fixed_expenses=fixed_expenses, month=month,
+                 matrix=organizer.build_monthly_matrix(cache['totals']),
+                 transport_matrix=organizer.build_monthly_matrix(cache['transport_totals']))
+    return cache['matrix'], cache['transport_matrix']
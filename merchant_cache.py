@@ -0,0 +1,154 @@
+#! /usr/bin/env python3
+
+import os
+import re
+import json
+import hashlib
+from collections import OrderedDict
+import category
+
+
+def normalize_merchant(place):
+    """Normalize a merchant string so that the different spellings of a same place share a cache entry
+
+    Args:
+        place (str): The 'place' field of a spending
+
+    Returns:
+        str: The lowered place, with any run of blank characters collapsed into a single space
+    """
+
+    return re.sub(r'\s+', ' ', place.lower())
+
+
+def keywords_fingerprint():
+    """Fingerprint every keyword list defined in category.py
+
+    Returns:
+        str: A hash that changes as soon as a keyword is added, removed or moved in category.py
+    """
+
+    keywords = {name: value for name, value in vars(category).items() if isinstance(value, list)}
+    return hashlib.sha256(json.dumps(keywords, sort_keys=True).encode()).hexdigest()
+
+
+class MerchantCache:
+    """Bounded LRU memory of the category given to each merchant
+
+    Entries are stored per scope (i.e. top level categories or transport sub categories) and are only valid
+    for the keyword lists they have been computed with. The cache empties itself when category.py changes.
+    """
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self.fingerprint = keywords_fingerprint()
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def validate(self, fingerprint=None):
+        """Drop all the entries if they have been computed with other keyword lists
+
+        Args:
+            fingerprint (str, optional): The fingerprint of the current keyword lists. Defaults to keywords_fingerprint().
+        """
+
+        fingerprint = keywords_fingerprint() if fingerprint is None else fingerprint
+        if fingerprint != self.fingerprint:
+            self._entries.clear()
+            self.fingerprint = fingerprint
+
+    def get(self, scope, merchant):
+        """Look up the category of a normalized merchant
+
+        Args:
+            scope (str): The set of categories the merchant has been classified against
+            merchant (str): Normalized merchant string
+
+        Returns:
+            str: The category name, None if the merchant is not cached
+        """
+
+        key = (scope, merchant)
+        label = self._entries.get(key)
+        if label is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return label
+
+    def put(self, scope, merchant, label):
+        """Remember the category of a normalized merchant, evicting the least recently used entries if full
+
+        Args:
+            scope (str): The set of categories the merchant has been classified against
+            merchant (str): Normalized merchant string
+            label (str): The category name
+        """
+
+        key = (scope, merchant)
+        self._entries[key] = label
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def entries(self):
+        """List the entries, least recently used first
+
+        Returns:
+            list: (scope, merchant, label) of each entry
+        """
+
+        return [(scope, merchant, label) for (scope, merchant), label in self._entries.items()]
+
+    def update(self, entries):
+        """Add the entries of another cache, i.e. the one of a worker process
+
+        Args:
+            entries (list): (scope, merchant, label) entries, as entries() lists them
+        """
+
+        for scope, merchant, label in entries:
+            self.put(scope, merchant, label)
+
+    def reset_counters(self):
+        self.hits, self.misses = 0, 0
+
+    def load(self, path):
+        """Load the entries persisted by save(). Entries computed with other keyword lists are ignored
+
+        Args:
+            path (str): Path to the cache file
+        """
+
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r') as file:
+                content = json.load(file)
+        except (OSError, ValueError):
+            print(f"Could not read category cache {os.path.basename(path)}, starting from an empty cache")
+            return
+
+        self.validate()
+        if content.get('fingerprint') != self.fingerprint:
+            return
+        for scope, merchant, label in content.get('entries', []):
+            # JSON has no tuple: (category, sub category) labels come back as lists
+            self.put(scope, merchant, tuple(label) if isinstance(label, list) else label)
+
+    def save(self, path):
+        """Persist the entries, least recently used first
+
+        Args:
+            path (str): Path to the cache file
+        """
+
+        with open(path, 'w') as file:
+            json.dump({'fingerprint': self.fingerprint,
+                       'entries': [list(entry) for entry in self.entries()]},
+                      file)
@@ -1,34 +1,238 @@
 #! /usr/bin/env python3
 
 import re
+from functools import lru_cache
+import numpy as np
 import pandas as pd
 from datetime import date
 import category
 import category_name
+import fixed_expenses
+import instrument
+import matcher
+from merchant_cache import MerchantCache, normalize_merchant
 
 
-def is_row_in_category(row, categories):
-    """Determines if row['place'] is in the given category
+TRANSPORT_SUB_CATEGORIES = next(sub_categories for name, _, sub_categories, _ in category.Tree if name == category_name.TRANSPORT)
+
+# Values of the 'category' and 'sub_category' columns. A category without sub categories is its own sub category
+CATEGORY_NAMES = [name for name, _, _, _ in category.Tree] + [category_name.MISC]
+SUB_CATEGORY_NAMES = [sub_name for name, keywords, sub_categories, default_sub_category in category.Tree
+                      for sub_name in ([sub_name for sub_name, _ in sub_categories] + [default_sub_category] if sub_categories else [name])]
+SUB_CATEGORY_NAMES = list(dict.fromkeys(SUB_CATEGORY_NAMES + [category_name.MISC]))
+
+# Category given to each merchant, shared by all the classifications of the process
+merchant_cache = MerchantCache()
+
+
+@lru_cache(maxsize=None)
+def _compile_keywords(keywords):
+    return re.compile('|'.join('(?:{})'.format(keyword) for keyword in keywords), re.IGNORECASE)
+
+
+def compile_category(categories):
+    """Compile a category list into a single case insensitive alternation pattern. Patterns are compiled only once
+
+    Args:
+        categories (list): Category list
+
+    Returns:
+        re.Pattern: A pattern matching any of the category's keywords
+    """
+
+    return _compile_keywords(tuple(categories))
+
+
+def classify_cached(places, scope, classify):
+    """Classify every distinct merchant only once, its label is then kept in merchant_cache
+
+    Args:
+        places (pandas.core.series.Series): The 'place' column to classify
+        scope (str): Name of the classification, to tell apart the cache entries of different classifications
+        classify (function): Classify a list of normalized merchants, returns the list of their labels
+
+    Returns:
+        tuple: (codes, uniques, labels) uniques[codes[i]] is the i-th place and labels[codes[i]] its label
+    """
+
+    merchant_cache.validate()
+
+    codes, uniques = pd.factorize(places, sort=False)
+    merchants = [normalize_merchant(place) for place in uniques]
+    labels = [merchant_cache.get(scope, merchant) for merchant in merchants]
+
+    # Only classify the merchants we have never seen before
+    missing = [i for i, label in enumerate(labels) if label is None]
+    if missing:
+        for i, label in zip(missing, classify([merchants[i] for i in missing])):
+            labels[i] = label
+            merchant_cache.put(scope, merchants[i], label)
+
+    return codes, uniques, labels
+
+
+@instrument.profiled
+def classify_tree(places):
+    """Label every place with its category and sub category in a single pass over the category tree
+
+    Args:
+        places (list): The places to classify
+
+    Returns:
+        list: (category name, sub category name) of each place
+    """
+
+    tree_matcher = matcher.get_tree_matcher(category.Tree, category_name.MISC)
+    return [tree_matcher.classify(place) for place in places]
+
+
+def amount_cents(transactions):
+    """Get the spendings' amounts in cents
+
+    Args:
+        transactions (pandas.core.frame.DataFrame): Spendings with either an 'amount' (dollars) or a 'cents' column
+
+    Returns:
+        numpy.ndarray: The integer amount in cents of each spending
+    """
+
+    if 'cents' in transactions:
+        return transactions['cents'].values
+    return np.rint(transactions['amount'].values.astype(float) * 100).astype(np.int64)
+
+
+@instrument.profiled
+def categorise(my_dataframe):
+    """Give every spending its category and sub category, in a single pass over the category tree
+
+    The result is compact: each merchant name is stored once ('place' is categorical), amounts are integer cents and
+    categories are small integer codes. The spendings are sorted by category then sub category so that the spendings of
+    a category are a slice of the dataframe, see split_by_category().
+
+    Args:
+        my_dataframe (pandas.core.frame.DataFrame): Unparsed dataframe with all uncategorized expenses. Spendings of the
+            transaction store already have their 'category' and 'sub_category', they are not classified again
+
+    Returns:
+        pandas.core.frame.DataFrame: [date, place, cents, category, sub_category], the last two being categorical columns
+    """
+
+    if 'category' in my_dataframe and not my_dataframe['category'].isna().any():
+        codes, uniques = pd.factorize(my_dataframe['place'], sort=False)
+        category_codes = pd.Categorical(my_dataframe['category'], categories=CATEGORY_NAMES).codes
+        sub_category_codes = pd.Categorical(my_dataframe['sub_category'], categories=SUB_CATEGORY_NAMES).codes
+    else:
+        codes, uniques, labels = classify_cached(my_dataframe['place'], 'tree', classify_tree)
+        category_codes = pd.Categorical([label[0] for label in labels], categories=CATEGORY_NAMES).codes[codes]
+        sub_category_codes = pd.Categorical([label[1] for label in labels], categories=SUB_CATEGORY_NAMES).codes[codes]
+
+    order = np.lexsort((sub_category_codes, category_codes))
+    return pd.DataFrame({'date': pd.to_datetime(my_dataframe['date'].values[order]),
+                         'place': pd.Categorical.from_codes(codes[order], uniques),
+                         'cents': amount_cents(my_dataframe)[order],
+                         'category': pd.Categorical.from_codes(category_codes[order], CATEGORY_NAMES),
+                         'sub_category': pd.Categorical.from_codes(sub_category_codes[order], SUB_CATEGORY_NAMES)})
+
+
+def tree_labels(places):
+    """Categorise places against the category tree, each distinct merchant only once
+
+    Args:
+        places (pandas.core.series.Series): The 'place' column to classify
+
+    Returns:
+        tuple: (categories, sub categories) numpy arrays with the category and sub category name of each place
+    """
+
+    codes, _, labels = classify_cached(places, 'tree', classify_tree)
+    return (np.array([label[0] for label in labels], dtype=object)[codes],
+            np.array([label[1] for label in labels], dtype=object)[codes])
+
+
+def recategorisation_candidates(transactions, old_tree):
+    """Find the spendings whose category may change since their categorisation with another version of category.Tree
+
+    A spending can only change category if it matches a keyword added to a category of higher priority than its own
+    (misc spendings have the lowest priority), or if it is in the category of a removed keyword that it matches.
+
+    Args:
+        transactions (pandas.core.frame.DataFrame): Spendings with their 'place', 'category' and 'sub_category'
+        old_tree (list): The category tree the spendings have been categorised with
+
+    Returns:
+        numpy.ndarray: True for the spendings to categorise again. None when categories or sub categories have been added,
+            removed or reordered: then all of them may change
+    """
+
+    old_labels, old_leaves = matcher.flatten_tree(old_tree, category_name.MISC)
+    labels, leaves = matcher.flatten_tree(category.Tree, category_name.MISC)
+    if old_labels != labels:
+        return None
+
+    # Leaves may share a label (i.e: transport's own keywords and misc transport): keep the lowest priority of the label
+    lowest_priority = {label: priority for priority, label in enumerate(labels)}
+    row_priority = np.full(len(transactions), len(labels) - 1)
+    label_rows = transactions.groupby(['category', 'sub_category'], sort=False, observed=True).indices
+    for label, rows in label_rows.items():
+        row_priority[rows] = lowest_priority.get(label, len(labels) - 1)
+
+    codes, uniques = pd.factorize(transactions['place'].values, sort=False)
+    candidates = np.zeros(len(transactions), dtype=bool)
+    for priority, (old_keywords, keywords) in enumerate(zip(old_leaves, leaves)):
+        added = [keyword for keyword in keywords if keyword not in old_keywords]
+        removed = [keyword for keyword in old_keywords if keyword not in keywords]
+        in_label = np.zeros(len(transactions), dtype=bool)
+        in_label[label_rows.get(labels[priority], [])] = True
+        for changed, affected in ((added, row_priority > priority), (removed, in_label)):
+            if changed:
+                # Only the distinct places of the affected spendings are searched
+                pattern = compile_category(changed)
+                places = np.unique(codes[affected])
+                matching = np.zeros(len(uniques), dtype=bool)
+                # Searched the way the places are classified, see classify_cached()
+                matching[places] = [pattern.search(normalize_merchant(uniques[place])) is not None for place in places]
+                candidates |= affected & matching[codes]
+
+    return candidates
+
+
+def split_by_category(transactions, column, names):
+    """Split a dataframe into one dataframe per category
+
+    When the dataframe is sorted by category, as categorise() returns it, each category's dataframe is a slice of it
+    rather than a copy.
 
     Args:
-        row (pandas.core.series.Series): Single row [date,place,amount] of a dataframe
-        category (list): Category list
+        transactions (pandas.core.frame.DataFrame): The dataframe to split, with a categorical {column}
+        column (str): Column holding the category name of each row
+        names (list): All the category names, including the ones without any row
 
     Returns:
-        bool: True if row in category, False otherwise
+        dict: A dictionary of dataframe. [key] = category name; [value] = dataframe with the all categorie's related expenses
     """
 
-    for place in categories:
-        if re.search(place, row['place'], re.IGNORECASE):
-            return True
-    return False
+    if not hasattr(transactions[column], 'cat'):
+        transactions = transactions.assign(**{column: pd.Categorical(transactions[column], categories=names)})
+    codes = transactions[column].cat.codes.values
+    if (np.diff(codes) < 0).any():
+        order = np.argsort(codes, kind='stable')
+        transactions, codes = transactions.take(order).reset_index(drop=True), codes[order]
 
+    categories = transactions[column].cat.categories
+    split = {}
+    for name in names:
+        code = categories.get_loc(name) if name in categories else -2
+        start, stop = np.searchsorted(codes, code, side='left'), np.searchsorted(codes, code, side='right')
+        split[name] = transactions.iloc[start:stop]
+    return split
 
+
+@instrument.profiled
 def organise_data_by_category(my_dataframe):
     """Parse all spending and populate smaller dataframes by categories
 
     Args:
-        my_dataframe (pandas.core.frame.DataFrame): my_dataframe  Unparsed dataframe with all uncategorized expenses
+        my_dataframe (pandas.core.frame.DataFrame): my_dataframe  Unparsed dataframe with all uncategorized expenses, or the result of categorise()
 
     Returns:
         dict: A dictionary of dataframe. [key] = category name; [value] = dataframe with the all categorie's related expenses
@@ -36,67 +240,20 @@ def organise_data_by_category(my_dataframe):
 
     print("Organise spendings into categories")
 
-    # it is 3 times faster to create a dataframe from a full dictionary rather than appending rows after rows to an already existing dataframe
-    dic_groc, dic_trans, dic_rest, dic_coffee, dic_bar, dic_misc, dic_bills = {}, {}, {}, {}, {}, {}, {}
-    g, t, r, c, b, m, f = [0] * 7  # indexes
-
-    # Let's go over each rows of the unsorted dataframe and populate the category's dictionary.
-    for _, row in my_dataframe.iterrows():
-        if is_row_in_category(row, category.Groceries):
-            dic_groc[g] = row
-            g = g + 1
-            continue
-
-        if is_row_in_category(row, category.Transport):
-            dic_trans[t] = row
-            t = t + 1
-            continue
-
-        if is_row_in_category(row, category.Restaurant):
-            dic_rest[r] = row
-            r = r + 1
-            continue
-
-        if is_row_in_category(row, category.Coffee):
-            dic_coffee[c] = row
-            c = c + 1
-            continue
-
-        if is_row_in_category(row, category.Bar):
-            dic_bar[b] = row
-            b = b + 1
-            continue
-
-        if is_row_in_category(row, category.Bills):
-            dic_bills[f] = row
-            f = f + 1
-            continue
-
-        # If none of the above then let's put it in misc spending
-        dic_misc[m] = row
-        m = m + 1
-
-    df_groc = pd.DataFrame.from_dict(dic_groc, orient='index', columns=['date', 'place', 'amount'])
-    df_trans = pd.DataFrame.from_dict(dic_trans, orient='index', columns=['date', 'place', 'amount'])
-    df_rest = pd.DataFrame.from_dict(dic_rest, orient='index', columns=['date', 'place', 'amount'])
-    df_coffee = pd.DataFrame.from_dict(dic_coffee, orient='index', columns=['date', 'place', 'amount'])
-    df_bar = pd.DataFrame.from_dict(dic_bar, orient='index', columns=['date', 'place', 'amount'])
-    df_misc = pd.DataFrame.from_dict(dic_misc, orient='index', columns=['date', 'place', 'amount'])
-    df_bills = pd.DataFrame.from_dict(dic_bills, orient='index', columns=['date', 'place', 'amount'])
-
-    all_df = {
-        category_name.GROCERIES: df_groc,
-        category_name.TRANSPORT: df_trans,
-        category_name.RESTAURANT: df_rest,
-        category_name.COFFEE: df_coffee,
-        category_name.BAR: df_bar,
-        category_name.MISC: df_misc,
-        category_name.BILLS: df_bills
-    }
-
-    return all_df
+    # Each merchant not cached yet is matched against the whole category tree at once. If nothing matches then it is a misc spending
+    if 'cents' not in my_dataframe:
+        my_dataframe = categorise(my_dataframe)
+
+    return split_by_category(my_dataframe, 'category', [category_name.GROCERIES,
+                                                        category_name.TRANSPORT,
+                                                        category_name.RESTAURANT,
+                                                        category_name.COFFEE,
+                                                        category_name.BAR,
+                                                        category_name.MISC,
+                                                        category_name.BILLS])
 
 
+@instrument.profiled
 def organise_transport_by_sub_cat(_dfTransport):
     """Parse all spending in transport and populate smaller dataframes by categories
 
@@ -107,137 +264,176 @@ def organise_transport_by_sub_cat(_dfTransport):
         [dict: A dictionary of dataframe. [key] = category name; [value] = dataframe with the all categorie's related expenses
     """
 
-    # it is 3 times faster to create a dataframe from a full dictionary rather than appending rows after rows to an already existing dataframe
-    dic_carshare, dic_rental, dic_cab, dic_translink, dic_misc, dic_car = {}, {}, {}, {}, {}, {}
-    csh, r, c, t, m, car = [0] * 6  # indexes
-
-    # Let's go over each rows of the unsorted dataframe and populate the category's dictionary.
-    for _, row in _dfTransport.iterrows():
-        if is_row_in_category(row, category.TransportCarShare):
-            dic_carshare[csh] = row
-            csh = csh + 1
-            continue
-        if is_row_in_category(row, category.TransportRental):
-            dic_rental[r] = row
-            r = r + 1
-            continue
-        if is_row_in_category(row, category.TransportCab):
-            dic_cab[c] = row
-            c = c + 1
-            continue
-        if is_row_in_category(row, category.TransportTranslink):
-            dic_translink[t] = row
-            t = t + 1
-            continue
-        if is_row_in_category(row, category.TransportMisc):
-            dic_misc[m] = row
-            m = m + 1
-            continue
-        if is_row_in_category(row, category.TransportCar):
-            dic_car[car] = row
-            car = car + 1
-            continue
-
-        # If none of the above then let's put it in misc spending
-        dic_misc[m] = row
-        m = m + 1
-
-    df_carshare = pd.DataFrame.from_dict(dic_carshare, orient='index', columns=['date', 'place', 'amount'])
-    df_rental = pd.DataFrame.from_dict(dic_rental, orient='index', columns=['date', 'place', 'amount'])
-    df_cab = pd.DataFrame.from_dict(dic_cab, orient='index', columns=['date', 'place', 'amount'])
-    df_translink = pd.DataFrame.from_dict(dic_translink, orient='index', columns=['date', 'place', 'amount'])
-    df_misc = pd.DataFrame.from_dict(dic_misc, orient='index', columns=['date', 'place', 'amount'])
-    df_car = pd.DataFrame.from_dict(dic_car, orient='index', columns=['date', 'place', 'amount'])
-
-    allTransport_df = {
-        category_name.TR_CARSHARE: df_carshare,
-        category_name.TR_RENTAL: df_rental,
-        category_name.TR_CAB: df_cab,
-        category_name.TR_TRANSLINK: df_translink,
-        category_name.TR_MISC: df_misc,
-        category_name.TR_CAR: df_car
-    }
-
-    return allTransport_df
-
-
-def extract_monthly_spending_by_category(_df, categoryName):
-    """Sumarize for each month the total spending for a given category
-
-    Args:
-        _df (dict): An organized by category dataframe
+    # Spendings categorised with categorise() already know their sub category. If none of the sub categories matches
+    # the place then it is a misc transport spending
+    if 'sub_category' not in _dfTransport:
+        _dfTransport = categorise(_dfTransport)
+
+    return split_by_category(_dfTransport, 'sub_category', [name for name, _ in TRANSPORT_SUB_CATEGORIES])
+
+
+def monthly_totals(categorised):
+    """Sum the spendings of all the categories by month, in a single groupby over every spending
+
+    Args:
+        categorised (dict): An organized by category dataframe
+
+    Returns:
+        pandas.core.frame.DataFrame: [index] = first day of the month; [columns] = categories having spendings. Months without any spending are missing
+    """
+
+    frames = [pd.DataFrame({'date': _df['date'].values, 'cents': amount_cents(_df), 'category': name})
+              for name, _df in categorised.items() if not _df.empty]
+    if not frames:
+        return monthly_totals_by(pd.DataFrame({'date': [], 'cents': [], 'category': []}), 'category')
+
+    return monthly_totals_by(pd.concat(frames, ignore_index=True, sort=False), 'category')
+
+
+def monthly_totals_by(transactions, column):
+    """Sum spendings by month and by the given column in a single groupby
+
+    Args:
+        transactions (pandas.core.frame.DataFrame): Spendings with at least 'date', 'amount' or 'cents' and {column} columns
+        column (str): The column holding the category of each spending, i.e: 'category' or 'sub_category'
+
+    Returns:
+        pandas.core.frame.DataFrame: [index] = first day of the month; [columns] = categories having spendings. Months without any spending are missing
+    """
+
+    if transactions.empty:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name='date'))
+
+    months = pd.Series(transactions['date'].values.astype('datetime64[M]').astype('datetime64[ns]'), name='date',
+                       index=transactions.index)
+    categories = transactions[column].astype(object)  # only the categories having spendings become columns
+
+    # Summed in cents so that the totals do not depend on the order the spendings have been summed in
+    cents = pd.Series(amount_cents(transactions), index=transactions.index)
+    return (cents.groupby([months, categories]).sum().unstack(column, fill_value=0) / 100).round(2)
+
+
+def report_totals(transactions):
+    """Sum categorised spendings by month for the two matrices of the report
+
+    Args:
+        transactions (pandas.core.frame.DataFrame): Categorised spendings, see categorise()
+
+    Returns:
+        tuple: The monthly totals by category and the monthly totals of transport by sub category
+    """
+
+    return (monthly_totals_by(transactions, 'category'),
+            monthly_totals_by(transactions[transactions['category'] == category_name.TRANSPORT], 'sub_category'))
+
+
+def add_monthly_totals(totals, other):
+    """Add up two monthly totals, i.e. the totals of two chunks of spendings
+
+    Args:
+        totals (pandas.core.frame.DataFrame): Monthly totals as returned by monthly_totals()
+        other (pandas.core.frame.DataFrame): Monthly totals as returned by monthly_totals()
+
+    Returns:
+        pandas.core.frame.DataFrame: Monthly totals of both, with the months and categories of both
+    """
+
+    return totals.add(other, fill_value=0).fillna(0).round(2)
+
+
+def fixed_monthly_expenses(months):
+    """Compute the fixed expenses (rent, ICBC...) of each given month, out of the fixed expenses schedule
+
+    Args:
+        months (pandas.core.indexes.datetimes.DatetimeIndex): First day of each month
+
+    Returns:
+        numpy.ndarray: The sum of the fixed expenses of each month
+    """
+
+    return fixed_expenses.expand_schedule(fixed_expenses.load_schedule(), months).sum(axis=1).values
+
+
+def build_monthly_matrix(totals):
+    """Expand monthly totals into a month x category matrix, zero filled from the first spending's month until today
+
+    Args:
+        totals (pandas.core.frame.DataFrame): Monthly totals as returned by monthly_totals()
+
+    Returns:
+        pandas.core.frame.DataFrame: [index] = first day of each month ('date'); [columns] = categories having spendings
+    """
+
+    if totals.empty:
+        return totals
+
+    # let's only do the math between the first spending and today to avoid blank values at the begining and the end of the charts
+    months = pd.date_range(start=totals.index.min(), end=pd.Timestamp(date.today()).replace(day=1), freq='MS', name='date')
+    matrix = totals.reindex(months, fill_value=0).astype(float)
+
+    if category_name.BILLS in matrix:
+        # Bills are accounted as the fixed expenses of each month
+        matrix[category_name.BILLS] = fixed_monthly_expenses(months).astype(float)
+
+    return matrix
+
+
+@instrument.profiled
+def monthly_matrix_by(transactions, column):
+    """Build the month x category matrix of categorised spendings, see categorise()
+
+    Args:
+        transactions (pandas.core.frame.DataFrame): Categorised spendings
+        column (str): 'category' for a matrix by category, 'sub_category' for a matrix by sub category
+
+    Returns:
+        pandas.core.frame.DataFrame: [index] = first day of each month ('date'); [columns] = categories having spendings
+    """
+
+    print("Extract monthly spendings by {}".format(column.replace('_', ' ')))
+    return build_monthly_matrix(monthly_totals_by(transactions, column))
+
+
+@instrument.profiled
+def stream_monthly_matrices(chunks):
+    """Categorise chunks of spendings one after the other and only keep their running monthly totals
+
+    Peak memory is bounded by the size of a chunk: the spendings are never all held in memory at once.
+
+    Args:
+        chunks (iterable): Unparsed dataframes with uncategorized expenses
+
+    Returns:
+        tuple: The month x category matrix of the categories and the one of the transport sub categories, as build_monthly_matrix() builds them
+    """
+
+    totals = monthly_totals({})
+    transport_totals = monthly_totals({})
+
+    for chunk in chunks:
+        chunk_totals, chunk_transport_totals = report_totals(categorise(chunk))
+        totals = add_monthly_totals(totals, chunk_totals)
+        transport_totals = add_monthly_totals(transport_totals, chunk_transport_totals)
+
+    return build_monthly_matrix(totals), build_monthly_matrix(transport_totals)
+
+
+def monthly_spending(matrix, categoryName):
+    """Extract the monthly spending of a category out of the month x category matrix
+
+    Args:
+        matrix (pandas.core.frame.DataFrame): The matrix built by build_monthly_matrix()
         categoryName (str): The category name you want to extract the information of
 
     Returns:
-        [type]: A dataframe with only 1 category's information and the sum of all the spendings for that category, listed by month
-    """
-
-    print("Extract monthly spendings for {}".format(categoryName))
-    df_temp = pd.DataFrame(columns=['date', 'amount'])
-
-    if _df[categoryName].empty:
-        df_temp.name = categoryName
-        return df_temp
-
-    if categoryName == category_name.BILLS:
-        df_rent = pd.DataFrame(columns=['date', 'amount'])
-        df_icbc = pd.DataFrame(columns=['date', 'amount'])
-
-    # let's only do the math between the first and last spending day in the csv file to avoid
-    # blank values at the begining and the end of the charts
-
-    # max_year = credit_card_spending_df['date'].max().year
-    max_year = date.today().year
-    max_month = date.today().month
-
-    mindate = date.today()  # to find the minimum date, let's start with mini = the maximum possible (aka today)
-    for el in _df.values():
-        mindate = min(mindate, el['date'].min())
-    min_year = mindate.year
-    min_month = mindate.month
-
-    for year in range(min_year, max_year + 1):
-        # Avoid 0 padding at the beginning and the end of the graph
-        start_month = 1 if year > min_year else min_month
-        end_month = 12 if year < max_year else max_month
-
-        start_month = min_month if year == min_year else 1
-        end_month = max_month if year == max_year else 12
-
-        # sum all spending from a whole month, each month of the year
-        for month in range(start_month, end_month + 1):
-            df_temp = df_temp.append({"date": pd.to_datetime("{}-{}".format(month, year)),
-                                     "amount": _df[categoryName].loc[(_df[categoryName].date.dt.month == month) &
-                                                                     (_df[categoryName].date.dt.year == year), 'amount'].sum()},
-                                     ignore_index=True)
-
-            if categoryName == category_name.BILLS:
-                # Handle rent
-                rent = 0
-                if year == 2018 and month < 12:
-                    rent = 1000
-                if (year == 2018 and month == 12) or year == 2019 or (year == 2020 and month <= 9):
-                    rent = 1550
-                if (year == 2020 and month >= 10) or year > 2020:
-                    rent = 1750
-                if rent > 0:
-                    df_rent = df_rent.append({"date": pd.to_datetime("{}-{}".format(month, year)), "amount": rent},
-                                             ignore_index=True)
-                # Handle ICBC
-                if (year == 2020 and month >= 11) or (year == 2021 and month <= 6):
-                    df_icbc = df_icbc.append({"date": pd.to_datetime("{}-{}".format(month, year)), "amount": 96},
-                                             ignore_index=True)
-
-    if categoryName == category_name.BILLS:  # Add rent to bills
-        df_rent.set_index('date', inplace=True)
-        df_icbc.set_index('date', inplace=True)
-
-        # append all fixed expenses. Some indexes might duplicate
-        df_bills = df_rent.append(df_icbc)
-        # Since some expenses may overlap, let's sum all the amounts from the ones that have the same index (month)
-        df_temp = df_bills.groupby(df_bills.index)['amount'].sum().reset_index()
+        pandas.core.frame.DataFrame: A dataframe with only 1 category's information and the sum of all the spendings for that category, listed by month
+    """
 
-    df_temp.name = categoryName
-    df_temp.set_index('date', inplace=True)
+    if categoryName not in matrix:
+        df_temp = pd.DataFrame(columns=['date', 'amount'])
+    else:
+        df_temp = pd.DataFrame({'amount': matrix[categoryName]})
 
+    df_temp.name = categoryName
     return df_temp
+
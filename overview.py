@@ -0,0 +1,98 @@
+#! /usr/bin/env python3
+
+import os
+import category_name
+
+# Shared by the commands rendering the overview: the PDF report, the dashboard and the watch mode. Like compute.py,
+# pandas and matplotlib are only imported when the pages are built
+
+
+def folder_statements(folder):
+    """List the statements of a folder and of its sub folders, one sub folder per account, i.e: Checking/chequing and
+    Checking/savings
+
+    Args:
+        folder (str): Path to the folder
+
+    Returns:
+        list: Statements paths, sorted
+    """
+
+    files = []
+    for entry in sorted(os.listdir(folder)):
+        path = folder + '/' + entry
+        if os.path.isdir(path):
+            files += [path + '/' + file for file in sorted(os.listdir(path)) if file.lower().endswith('.csv')]
+        elif entry.lower().endswith('.csv'):
+            files.append(path)
+    return sorted(files)
+
+
+def statement_files(statements_folder):
+    """List the statements of a statements folder: statements/CreditCard and the optional statements/Checking
+
+    The statements of two accounts of a same bank must be kept in two sub folders, see transfers.statement_accounts()
+
+    Args:
+        statements_folder (str): Path to the statements folder
+
+    Raises:
+        FileNotFoundError: If there is no CreditCard folder
+
+    Returns:
+        tuple: (credit card statements, checking account statements) paths, sorted
+    """
+
+    credit_card_folder = statements_folder + "/CreditCard"
+    checking_folder = statements_folder + "/Checking"
+    csv_files = folder_statements(credit_card_folder)
+
+    # Checking account statements are optional. Their credit card payments and transfers are not accounted twice
+    checking_files = folder_statements(checking_folder) if os.path.isdir(checking_folder) else []
+
+    return csv_files, checking_files
+
+
+# Name of each page of report_pages(), in order
+PAGE_NAMES = ['categories', 'stacked', 'average', 'transport']
+
+
+def report_pages(monthly_all, monthly_all_transport):
+    """List the pages of the overview PDF
+
+    Args:
+        monthly_all (pandas.core.frame.DataFrame): The month x category matrix
+        monthly_all_transport (pandas.core.frame.DataFrame): The month x transport sub category matrix
+
+    Returns:
+        list: (builder name, monthly spendings, keyword arguments) of each page, see render.render_report()
+    """
+
+    import organizer
+
+    monthly_groceries = organizer.monthly_spending(monthly_all, category_name.GROCERIES)
+    monthly_transport = organizer.monthly_spending(monthly_all, category_name.TRANSPORT)
+    monthly_restaurant = organizer.monthly_spending(monthly_all, category_name.RESTAURANT)
+    monthly_coffee = organizer.monthly_spending(monthly_all, category_name.COFFEE)
+    monthly_bar = organizer.monthly_spending(monthly_all, category_name.BAR)
+    monthly_misc = organizer.monthly_spending(monthly_all, category_name.MISC)
+    monthly_bills = organizer.monthly_spending(monthly_all, category_name.BILLS)
+
+    monthly_transport_carshare = organizer.monthly_spending(monthly_all_transport, category_name.TR_CARSHARE)
+    monthly_transport_rental = organizer.monthly_spending(monthly_all_transport, category_name.TR_RENTAL)
+    monthly_transport_cab = organizer.monthly_spending(monthly_all_transport, category_name.TR_CAB)
+    monthly_transport_translink = organizer.monthly_spending(monthly_all_transport, category_name.TR_TRANSLINK)
+    monthly_transport_car = organizer.monthly_spending(monthly_all_transport, category_name.TR_CAR)
+
+    monthly_spending = [monthly_bills, monthly_groceries, monthly_transport, monthly_restaurant,
+                        monthly_coffee, monthly_bar, monthly_misc]
+
+    monthly_transport = [monthly_transport_carshare, monthly_transport_rental, monthly_transport_cab, monthly_transport_translink, monthly_transport_car]  # not interested about misc
+
+    pages = []
+    pages.append(('monthly_bar_by_cat', monthly_spending[1:], {}))  # Do not plot bills expenses
+    pages.append(('monthly_bar_stacked', monthly_spending, {}))
+    pages.append(('average_pie', monthly_spending, {}))
+    pages.append(('monthly_bar_by_cat', monthly_transport, {'useAbsoluteAvg': True}))
+    # pages.append(('monthly_bar_stacked', monthly_transport, {'useAbsoluteAvg': True, 'title': "Month by month transport"}))
+    return pages
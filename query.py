@@ -0,0 +1,158 @@
+#! /usr/bin/env python3
+
+import re
+import numpy as np
+import pandas as pd
+import instrument
+import organizer
+from merchant_cache import normalize_merchant
+
+# Store numbers, i.e: "tim hortons #0335 kamloops bc" -> "tim hortons kamloops bc"
+STORE_NUMBER = re.compile(r'\s*#\s*\d+')
+
+
+def period_bounds(start=None, end=None):
+    """Turn the bounds of a date range into timestamps, each bound covering its whole period
+
+    Args:
+        start (str, optional): First day, month or year, i.e: '2020-03-15', '2020-03' or '2020'. Defaults to None.
+        end (str, optional): Last day, month or year, included. Defaults to None.
+
+    Raises:
+        ValueError: If a bound is not a date
+
+    Returns:
+        tuple: (first instant, last instant), None for a missing bound
+    """
+
+    return (pd.Period(start).start_time if start is not None else None,
+            pd.Period(end).end_time if end is not None else None)
+
+
+def merchant_key(place):
+    """Group the spellings and the stores of a same merchant
+
+    Args:
+        place (str): The 'place' field of a spending
+
+    Returns:
+        str: The normalized place, without store number
+    """
+
+    return STORE_NUMBER.sub('', normalize_merchant(place)).strip()
+
+
+class DateIndex:
+    """Spendings in date order, so that a date range is found by binary search and read as a slice
+
+    The spendings of the transaction store and of the transaction database are already in date order, see
+    transaction_store.by_date(): they are not sorted again. The other filters are only applied to the spendings of the
+    date range.
+    """
+
+    @instrument.profiled
+    def __init__(self, spendings):
+        """Index the spendings, sorting them by date only if they are not in date order yet
+
+        Args:
+            spendings (pandas.core.frame.DataFrame): Categorised spendings with 'date', 'place', 'amount', 'category'
+                and 'sub_category' columns, see transaction_store.spendings()
+        """
+
+        if not spendings['date'].is_monotonic_increasing:
+            spendings = spendings.iloc[np.argsort(spendings['date'].values, kind='stable')]
+        self.spendings = spendings.reset_index(drop=True)
+        self.dates = self.spendings['date'].values
+
+    def __len__(self):
+        return len(self.spendings)
+
+    def between(self, start=None, end=None):
+        """Get the spendings of a date range
+
+        Args:
+            start (pandas.Timestamp, optional): First instant. Defaults to None.
+            end (pandas.Timestamp, optional): Last instant, included. Defaults to None.
+
+        Returns:
+            pandas.core.frame.DataFrame: The spendings of the range, ordered by date
+        """
+
+        first = 0 if start is None else np.searchsorted(self.dates, np.datetime64(start), side='left')
+        last = len(self.dates) if end is None else np.searchsorted(self.dates, np.datetime64(end), side='right')
+        return self.spendings.iloc[first:last]
+
+    @instrument.profiled
+    def query(self, start=None, end=None, category=None, merchant=None, min_amount=None, max_amount=None):
+        """Get the spendings matching all the given filters
+
+        Args:
+            start (str, optional): First day, month or year, see period_bounds(). Defaults to None.
+            end (str, optional): Last day, month or year, included. Defaults to None.
+            category (str, optional): Category or sub category name. Defaults to None.
+            merchant (str, optional): Regular expression searched in the place, case insensitive. Defaults to None.
+            min_amount (float, optional): Smallest amount. Defaults to None.
+            max_amount (float, optional): Largest amount, included. Defaults to None.
+
+        Raises:
+            ValueError: If a date bound is not a date
+            re.error: If the merchant pattern is not a regular expression
+
+        Returns:
+            pandas.core.frame.DataFrame: [date], [place], [amount], [category] and [sub_category] of the matching
+                spendings, ordered by date
+        """
+
+        rows = self.between(*period_bounds(start, end))
+        mask = np.ones(len(rows), dtype=bool)
+
+        if category is not None:
+            category = category.lower()
+            mask &= (rows['category'].values == category) | (rows['sub_category'].values == category)
+        if min_amount is not None:
+            mask &= rows['amount'].values >= min_amount
+        if max_amount is not None:
+            mask &= rows['amount'].values <= max_amount
+        if merchant is not None:
+            # The pattern is only searched once per distinct place
+            codes, uniques = pd.factorize(rows['place'].values)
+            pattern = re.compile(merchant, re.IGNORECASE)
+            matches = np.fromiter((pattern.search(place) is not None for place in uniques), dtype=bool, count=len(uniques))
+            mask &= matches[codes]
+
+        return rows[mask][['date', 'place', 'amount', 'category', 'sub_category']]
+
+
+def monthly_sums(rows):
+    """Sum spendings by month and by category, or by sub category when they all share a category
+
+    Args:
+        rows (pandas.core.frame.DataFrame): Spendings, see DateIndex.query()
+
+    Returns:
+        pandas.core.frame.DataFrame: [index] = first day of the month; [columns] = categories. Months without any
+            spending are missing
+    """
+
+    by_sub_category = len(rows) > 0 and rows['category'].nunique() == 1
+    return organizer.monthly_totals_by(rows, 'sub_category' if by_sub_category else 'category')
+
+
+def top_merchants(rows, count=10):
+    """Rank the merchants by the total spent, the stores of a same merchant being grouped, see merchant_key()
+
+    Args:
+        rows (pandas.core.frame.DataFrame): Spendings, see DateIndex.query()
+        count (int, optional): Number of merchants. Defaults to 10.
+
+    Returns:
+        pandas.core.frame.DataFrame: [index] = merchant; [spendings] = number of spendings; [amount] = total spent
+    """
+
+    codes, uniques = pd.factorize(rows['place'].values)
+    merchants = np.array([merchant_key(str(place)) for place in uniques], dtype=object)[codes]
+    cents = pd.Series(organizer.amount_cents(rows), index=pd.Index(merchants, name='merchant'))
+    totals = cents.groupby(level=0).agg(['count', 'sum'])
+    totals.columns = ['spendings', 'amount']
+    totals['amount'] = totals['amount'] / 100
+    return totals.sort_values(by=['amount', 'spendings'], ascending=False).head(count)
@@ -1,12 +1,16 @@
 #! /usr/bin/env python3
 
+import io
 import math
-import numpy
-from pandas.tseries.offsets import MonthEnd
+from concurrent.futures import ProcessPoolExecutor
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_pdf import PdfPages
 import matplotlib.dates as mdates
+import matplotlib.transforms as mtransforms
 import pandas as pd
 from datetime import date
+import average
+import instrument
 
 colours = ['#5DADE2',  # blue
            '#F5B041',  # orange
@@ -16,72 +20,131 @@ colours = ['#5DADE2',  # blue
            '#808B96',  # grey
            '#F7DC6F']  # yellow
 
+# Builders having a fast rendering mode, see build_page()
+FAST_BUILDERS = {'monthly_bar_by_cat', 'monthly_bar_stacked'}
+
+# Room in points taken along the X axis by a bar label, i.e: "1234", and by a month tick label (rotated of 45 deg)
+LABEL_WIDTH = 30
+TICK_WIDTH = 20
 
-def autolabel(rects, ax, height):
-    """Attach a text label above each ploted bar
+
+def label_stride(ax, count, width):
+    """Compute how many labels to skip so that the labels of an axis do not overlap
 
     Args:
-        rects (matplotlib.container.BarContainer): The rectangles (each ploted bar)
         ax (matplotlib.axes._subplots.AxesSubplot): Axis
-        height (pandas.core.series.Series): The height (monthy $ value)
+        count (int): Number of labels to place along the X axis
+        width (int): Room in points taken by a label
+
+    Returns:
+        int: 1 to keep every label, n to keep one label out of n
     """
 
-    for index, rect in enumerate(rects):
-        ax.annotate('{}'.format(int(height[index])),
-                    xy=(rect.get_x() + rect.get_width() / 2, height[index]),
-                    xytext=(0, 1),  # 1 points vertical offset
-                    textcoords="offset points",
-                    ha='center',
-                    va='bottom')
+    fig = ax.get_figure()
+    room = max(int(ax.get_position().width * fig.get_figwidth() * 72 // width), 1)
+    return max(math.ceil(count / room), 1)
 
 
-def compute_average(_df, forMonths=0, endDay=pd.datetime.now().date(), absolute=False):
-    """Calculates the average value in the 'amount' column of a given dataframe
+def batch_labels(ax, xs, ys, texts, offset=(0, 1), stride=1, **kwargs):
+    """Write text labels next to data points, keeping one label out of {stride} starting from the last one
+
+    The labels are plain texts sharing a single offset transform: they are much cheaper to create and to draw than
+    one annotation per label.
 
     Args:
-        _df (pandas.core.frame.DataFrame): The dataframe to extract the spending mean value of
-        forMonths (int, optional): The period months from today's date to calculate the average of. Defaults to 0.
-        endDay (pandas._libs.tslibs.timestamps.Timestamp, optional): Boolean. If False the average computation will no consider the min value and max value for calculation. Defaults to pd.datetime.now().date().
-        absolute (bool, optional): Datetime type. Calculate average until this day and for the past {forMonths}. Defaults to False.
+        ax (matplotlib.axes._subplots.AxesSubplot): Axis
+        xs (list): X of each point, in data coordinates (numbers or dates)
+        ys (list): Y of each point
+        texts (list): Label of each point
+        offset (tuple, optional): (x, y) offset of the labels in points. Defaults to (0, 1).
+        stride (int, optional): Keep one label out of {stride}. Defaults to 1.
+        kwargs: Text properties of the labels
+    """
 
-    Returns:
-        int: The average spending over the last 'forMonths'
+    transform = mtransforms.offset_copy(ax.transData, fig=ax.get_figure(), x=offset[0], y=offset[1], units='points')
+    for index in range(len(texts) - 1, -1, -stride):
+        ax.text(xs[index], ys[index], texts[index], transform=transform, **kwargs)
+
+
+def format_month_axis(ax, months, fast=False):
+    """Rotate the X labels and tick every month, or every few months when there are too many for the axis width
+
+    Args:
+        ax (matplotlib.axes._subplots.AxesSubplot): Axis
+        months (int): Number of months plotted
+        fast (bool, optional): Cap the number of ticks. Defaults to False.
     """
 
-    # Allows to compute the average over the last forMonths time
-    if forMonths > 0:
-        fromDay = endDay - pd.DateOffset(months=int(forMonths))
-        fromDay = _df.index.min() if fromDay < _df.index.min() else fromDay  # keep lower boundary at first date recorded
-    else:
-        fromDay = _df.index.min()
+    # 45 deg angle for X labels
+    plt.setp(ax.get_xticklabels(),
+             rotation=45,
+             ha="right")
+
+    # Set the locator
+    locator = mdates.MonthLocator(interval=label_stride(ax, months, TICK_WIDTH) if fast else 1)  # every month
+    # Specify the format - %b gives us Jan, Feb...
+    fmt = mdates.DateFormatter('%b %Y')
+
+    ax.xaxis.set_major_locator(locator)
+    # Specify formatter
+    ax.xaxis.set_major_formatter(fmt)
+
+
+def reuse_axes(fig, count):
+    """Clear the axes of a figure built earlier, to draw a new chart with the same layout
+
+    Args:
+        fig (matplotlib.figure.Figure): The figure to reuse, None to build a new one
+        count (int): Number of axes the chart needs
 
-    fromDay = fromDay.date()  # remove hour, minute, second
+    Returns:
+        list: The cleared axes, None if the figure cannot be reused
+    """
 
-    # drop everything not in the range [from;until]
-    _df = _df.drop(_df[_df.index < pd.to_datetime(fromDay)].index)
-    _df = _df.drop(_df[_df.index > pd.to_datetime(endDay)].index)
+    if fig is None or len(fig.axes) != count:
+        return None
+    for ax in fig.axes:
+        ax.cla()
+        ax.set_axis_on()
+    return fig.axes
 
-    # To calculate the average, let's get rid of the extremums (only if we don't want an absolute average), the current month and all 0$ spending months
-    if not absolute:
-        _df = _df.drop(_df[_df.amount == _df.amount.max()].index)
-        _df = _df.drop(_df[_df.amount == _df.amount.min()].index)
-        _df = _df.drop(_df[_df.amount == 0].index)
 
-    # get rid of any data of the current month as it is not complete.
-    _df = _df.drop(_df[(_df.index.month == date.today().month) & (_df.index.year == date.today().year)].index)
+def autolabel(rects, ax, height, fast=False):
+    """Attach a text label above each ploted bar
 
-    # Handles the cases where after dropping all the rows we end up with an empty dataframe
-    _mean = 0 if numpy.isnan(_df.mean().amount) else int(_df.mean().amount)
+    Args:
+        rects (matplotlib.container.BarContainer): The rectangles (each ploted bar)
+        ax (matplotlib.axes._subplots.AxesSubplot): Axis
+        height (pandas.core.series.Series): The height (monthy $ value)
+        fast (bool, optional): Write the labels in a batch and only as many as the axis width can hold. Defaults to False.
+    """
+
+    if fast:
+        batch_labels(ax, [rect.get_x() + rect.get_width() / 2 for rect in rects], list(height),
+                     ['{}'.format(int(value)) for value in height],
+                     stride=label_stride(ax, len(rects), LABEL_WIDTH), ha='center', va='bottom')
+        return
 
-    return _mean
+    for index, rect in enumerate(rects):
+        ax.annotate('{}'.format(int(height[index])),
+                    xy=(rect.get_x() + rect.get_width() / 2, height[index]),
+                    xytext=(0, 1),  # 1 points vertical offset
+                    textcoords="offset points",
+                    ha='center',
+                    va='bottom')
 
 
-def monthly_bar_by_cat(_df_list, useAbsoluteAvg=False):
+@instrument.profiled
+def monthly_bar_by_cat(_df_list, useAbsoluteAvg=False, fast=False, fig=None):
     """Will plot a bar chart for each category. X axis will be scaled by month
 
     Args:
         _df_list (list): List that contains each categorie's dataframe spending per month
         useAbsoluteAvg (bool, optional): If False the average computation will no consider the min value and max value for calculation. Defaults to False.
+        fast (bool, optional): Write the labels in batches and cap their number, as well as the number of ticks, to what
+            the axes width can hold. Long histories render much faster. Defaults to False.
+        fig (matplotlib.figure.Figure, optional): A figure this function built earlier, reused with its layout instead
+            of building a new one. Defaults to None.
 
     Returns:
         matplotlib.figure.Figure: The figure with all the charts
@@ -93,8 +156,11 @@ def monthly_bar_by_cat(_df_list, useAbsoluteAvg=False):
     if math.modf(row)[0] != 0.0:
         row += 1
 
-    fig, ax = plt.subplots(int(row), int(col), figsize=(30, 15))
-    ax = ax.flatten()
+    ax = reuse_axes(fig, int(row) * int(col))
+    layout = ax is None
+    if layout:
+        fig, ax = plt.subplots(int(row), int(col), figsize=(30, 15))
+        ax = ax.flatten()
 
     for i, el in enumerate(_df_list):
         print("Render monthy spending on bar graph for {}".format(el.name))
@@ -121,32 +187,20 @@ def monthly_bar_by_cat(_df_list, useAbsoluteAvg=False):
 
             # Plot the average monthly spending on the corresponding graph
             # Let's plot past averages over multiple 6 months periods as well as an all time average
-
-            # Start calculating from last month's last day
-            _endPeriod = date.today() - pd.DateOffset(months=1)
-            _endPeriod += MonthEnd(0)
-
-            _6monthsAvgDates = []
-            _6monthsAvgValues = []
-
-            compute = True
-            while(compute):
-                avgOver6mth = compute_average(el, endDay=_endPeriod, forMonths=6, absolute=True)
-                _6monthsAvgValues.append(avgOver6mth)
-                _6monthsAvgDates.append(_endPeriod)
-
-                _endPeriod -= pd.DateOffset(months=6)  # New end period moved back 6months
-                if _endPeriod <= el.index.min():  # We've reached the end of the dataframe
-                    _endPeriod = el.index.min()
-                    compute = False
-
-                _6monthsAvgDates.append(_endPeriod)
-                _6monthsAvgValues.append(avgOver6mth)
+            averages = average.compute_averages(el)
+            _6monthsAvgDates = averages['period_dates']
+            _6monthsAvgValues = averages['period_values']
 
             ax[i].plot(_6monthsAvgDates, _6monthsAvgValues, '-o',
                        color='red',
                        label="Avg over 6 months period")
-            for j, val in enumerate(zip(_6monthsAvgDates, _6monthsAvgValues)):
+            if fast:
+                # Periods' starts, see below
+                batch_labels(ax[i], mdates.date2num(_6monthsAvgDates[1::2]), _6monthsAvgValues[1::2],
+                             ['{}'.format(value) for value in _6monthsAvgValues[1::2]], offset=(-5, 1),
+                             stride=label_stride(ax[i], len(_6monthsAvgValues) // 2, LABEL_WIDTH),
+                             ha='right', va='bottom', color='red')
+            for j, val in enumerate(zip(_6monthsAvgDates, _6monthsAvgValues) if not fast else []):
                 # _6monthsAvgDates is ordered from recent to old so the plot "starts" from the right
                 # We don't need to annotate twice the same value. let's skip one.
                 if j % 2 > 0:
@@ -158,7 +212,7 @@ def monthly_bar_by_cat(_df_list, useAbsoluteAvg=False):
                                    va='bottom',
                                    color='red')
 
-            avg = compute_average(el, absolute=useAbsoluteAvg)
+            avg = averages['absolute'] if useAbsoluteAvg else averages['trimmed']
             if avg > 0:  # No need to plot the average if it's 0
                 ax[i].axhline(y=avg,
                               color="blue",
@@ -171,12 +225,9 @@ def monthly_bar_by_cat(_df_list, useAbsoluteAvg=False):
                                va='bottom',
                                color='blue')
 
-            autolabel(bar, ax[i], el['amount'])
+            autolabel(bar, ax[i], el['amount'], fast)
 
-            # 45 deg angle for X labels
-        plt.setp(ax[i].get_xticklabels(),
-                 rotation=45,
-                 ha="right")
+        format_month_axis(ax[i], len(el), fast)
 
         # Add XY labels and title
         ax[i].title.set_weight('extra bold')
@@ -184,40 +235,42 @@ def monthly_bar_by_cat(_df_list, useAbsoluteAvg=False):
         ax[i].title.set_text("{}".format(el.name).title())
         ax[i].set_ylabel('Spending ($)', fontsize='xx-large')
         ax[i].set_xlabel('Date', fontsize='xx-large')
-
-        # Set the locator
-        locator = mdates.MonthLocator()  # every month
-        # Specify the format - %b gives us Jan, Feb...
-        fmt = mdates.DateFormatter('%b %Y')
-
-        ax[i].xaxis.set_major_locator(locator)
-        # Specify formatter
-        ax[i].xaxis.set_major_formatter(fmt)
         ax[i].legend()
 
     # Remove unused plots
     for j in range(i + 1, len(ax)):
         ax[j].set_axis_off()
 
-    plt.tight_layout(w_pad=2.3, h_pad=1.3)
+    # A reused figure keeps the layout computed when it was built: computing it again costs as much as drawing the figure
+    if layout:
+        fig.tight_layout(w_pad=2.3, h_pad=1.3)
 
     return fig
 
 
-def monthly_bar_stacked(_df_list, useAbsoluteAvg=False, title="Month by month spending"):
-    """[summary]
+@instrument.profiled
+def monthly_bar_stacked(_df_list, useAbsoluteAvg=False, title="Month by month spending", fast=False, fig=None):
+    """Will plot the spending of all the categories stacked on a single bar chart. X axis will be scaled by month
 
     Args:
         _df_list (list): List that contains each categorie's dataframe spending per month
         useAbsoluteAvg (bool, optional): If False the average computation will no consider the min value and max value for calculation. Defaults to False.
         title (str, optional): Give your graph a tittle. Defaults to "Month by month spending".
+        fast (bool, optional): Write the labels in batches and cap their number, as well as the number of ticks, to what
+            the axis width can hold. Long histories render much faster. Defaults to False.
+        fig (matplotlib.figure.Figure, optional): A figure this function built earlier, reused instead of building a
+            new one. Defaults to None.
 
     Returns:
         matplotlib.figure.Figure: The figure with the calculated chart
     """
 
     print("Render monthy spending on stack graph for all categories")
-    fig, ax = plt.subplots(1, 1, figsize=(30, 15))
+    ax = reuse_axes(fig, 1)
+    if ax is None:
+        fig, ax = plt.subplots(1, 1, figsize=(30, 15))
+    else:
+        ax = ax[0]
 
     bottom_value = 0
     empty_chart = True
@@ -253,7 +306,8 @@ def monthly_bar_stacked(_df_list, useAbsoluteAvg=False, title="Month by month sp
             tot_spending = tot_spending.add(_df, fill_value=0)
 
         # Plot the average monthly spending on the corresponding graph
-        avg = compute_average(tot_spending, absolute=useAbsoluteAvg)
+        averages = average.compute_averages(tot_spending)
+        avg = averages['absolute'] if useAbsoluteAvg else averages['trimmed']
 
         if avg > 0:  # No need to plot the average if it's 0
             ax.axhline(y=avg,
@@ -267,32 +321,20 @@ def monthly_bar_stacked(_df_list, useAbsoluteAvg=False, title="Month by month sp
                         va='bottom',
                         color='blue')
 
-        # Start calculating from last month's last day
-        _endPeriod = date.today() - pd.DateOffset(months=1)
-        _endPeriod += MonthEnd(0)
-
-        _6monthsAvgDates = []
-        _6monthsAvgValues = []
-
-        compute = True
-        while(compute):
-            avgOver6mth = compute_average(tot_spending, endDay=_endPeriod, forMonths=6, absolute=True)
-            _6monthsAvgValues.append(avgOver6mth)
-            _6monthsAvgDates.append(_endPeriod)
-
-            _endPeriod -= pd.DateOffset(months=6)  # New end period moved back 6months
-            if _endPeriod <= tot_spending.index.min():  # We've reached the end of the dataframe
-                _endPeriod = tot_spending.index.min()
-                compute = False
-
-            _6monthsAvgDates.append(_endPeriod)
-            _6monthsAvgValues.append(avgOver6mth)
+        _6monthsAvgDates = averages['period_dates']
+        _6monthsAvgValues = averages['period_values']
 
         ax.plot(_6monthsAvgDates, _6monthsAvgValues, '-o',
                 color='red',
                 label="Avg over 6 months period")
 
-        for j, val in enumerate(zip(_6monthsAvgDates, _6monthsAvgValues)):
+        if fast:
+            # Periods' starts, see below
+            batch_labels(ax, mdates.date2num(_6monthsAvgDates[1::2]), _6monthsAvgValues[1::2],
+                         ['{}'.format(value) for value in _6monthsAvgValues[1::2]], offset=(-5, 1),
+                         stride=label_stride(ax, len(_6monthsAvgValues) // 2, LABEL_WIDTH),
+                         ha='right', va='bottom', color='red')
+        for j, val in enumerate(zip(_6monthsAvgDates, _6monthsAvgValues) if not fast else []):
             # _6monthsAvgDates is ordered from recent to old so the plot "starts" from the right
             # We don't need to annotate twice the same value. let's skip one.
             if j % 2 > 0:
@@ -304,12 +346,9 @@ def monthly_bar_stacked(_df_list, useAbsoluteAvg=False, title="Month by month sp
                             va='bottom',
                             color='red')
 
-    autolabel(bar, ax, tot_spending['amount'])
+    autolabel(bar, ax, tot_spending['amount'], fast)
 
-    # 45 deg angle for X labels
-    plt.setp(ax.get_xticklabels(),
-             rotation=45,
-             ha="right")
+    format_month_axis(ax, len(bar), fast)
 
     # Add XY labels and title
     ax.title.set_weight('extra bold')
@@ -317,26 +356,20 @@ def monthly_bar_stacked(_df_list, useAbsoluteAvg=False, title="Month by month sp
     ax.title.set_text(title)
     ax.set_ylabel('Spending ($)', fontsize='xx-large')
     ax.set_xlabel('Date', fontsize='xx-large')
-
-    # Set the locator
-    locator = mdates.MonthLocator()  # every month
-    # Specify the format - %b gives us Jan, Feb...
-    fmt = mdates.DateFormatter('%b %Y')
-
-    ax.xaxis.set_major_locator(locator)
-    # Specify formatter
-    ax.xaxis.set_major_formatter(fmt)
     ax.legend()
 
     # plt.tight_layout(w_pad=200, h_pad=500)
     return fig
 
 
-def average_pie(_df_list):
+@instrument.profiled
+def average_pie(_df_list, fig=None):
     """Will plot a pie chart representing the proportion of spending by category
 
     Args:
         _df_list (list): A list of dataframe contaning the average overall spending by category
+        fig (matplotlib.figure.Figure, optional): A figure this function built earlier, reused instead of building a
+            new one. Defaults to None.
 
     Returns:
         matplotlib.figure.Figure: The figure with the calculated chart
@@ -344,14 +377,18 @@ def average_pie(_df_list):
 
     print("Render average spending by category on pie chart")
 
-    avg_df = pd.DataFrame(columns=['name', 'amount'])
-
+    names, amounts = [], []
     for el in _df_list:
         if not el.empty:  # Do not handle categories with no data
-            average = compute_average(el, absolute=True)
-            avg_df = avg_df.append({'name': el.name, 'amount': average}, ignore_index=True)
+            names.append(el.name)
+            amounts.append(average.compute_averages(el)['absolute'])
+    avg_df = pd.DataFrame({'name': names, 'amount': amounts})
 
-    fig, ax = plt.subplots(1, 1, figsize=(30, 15))
+    ax = reuse_axes(fig, 1)
+    if ax is None:
+        fig, ax = plt.subplots(1, 1, figsize=(30, 15))
+    else:
+        ax = ax[0]
     explodes = [0.0] * len(avg_df)
     explodes[1] = 0.2  # select the 1 index to explode the piece of the pie. The value has been determined by visual tests
     _, _, autotexts = ax.pie(avg_df['amount'], labels=avg_df['name'],
@@ -371,3 +408,86 @@ def average_pie(_df_list):
     ax.title.set_fontsize('xx-large')
 
     return fig
+
+
+def build_page(page, fig=None, fast=False):
+    """Build the figure of a report page
+
+    Args:
+        page (tuple): (name of the figure builder of this module, list of the monthly spending dataframes, builder's keyword arguments)
+        fig (matplotlib.figure.Figure, optional): The figure of an earlier build of this page, to draw into instead of
+            building a new one. Defaults to None.
+        fast (bool, optional): Use the fast rendering of the builders having one. Defaults to False.
+
+    Returns:
+        matplotlib.figure.Figure: The page's figure
+    """
+
+    builder, _df_list, kwargs = page
+    if fig is not None:
+        kwargs = dict(kwargs, fig=fig)
+    if fast and builder in FAST_BUILDERS:
+        kwargs = dict(kwargs, fast=True)
+    return globals()[builder](_df_list, **kwargs)
+
+
+def _render_page_image(builder, _df_list, names, kwargs, dpi, fast):
+    # Runs in a worker process: never open a window, and give back the dataframes' names which are not pickled
+    plt.switch_backend('Agg')
+    for el, name in zip(_df_list, names):
+        el.name = name
+
+    fig = build_page((builder, _df_list, kwargs), fast=fast)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi)
+    size = fig.get_size_inches()
+    plt.close(fig)
+    return buffer.getvalue(), size
+
+
+def _image_figure(png, size):
+    fig = plt.figure(figsize=size)
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.imshow(plt.imread(io.BytesIO(png), format='png'), aspect='auto', interpolation='none')
+    ax.set_axis_off()
+    return fig
+
+
+@instrument.profiled
+def render_report(pages, output_pdf, jobs=1, dpi=100, fast=False):
+    """Render the report pages and write them, in order, in a PDF document
+
+    With jobs > 1 the figures are built in separate worker processes (Agg backend), each one rendered as a {dpi} image,
+    then assembled into the PDF document. Otherwise the figures are built one after the other and written as vector graphics.
+
+    Args:
+        pages (list): The report pages, see build_page()
+        output_pdf (str): Path to the PDF document
+        jobs (int, optional): Number of pages rendered at the same time. Defaults to 1.
+        dpi (int, optional): Resolution of the pages rendered by the worker processes. Defaults to 100.
+        fast (bool, optional): Use the fast rendering of the builders having one, see build_page(). Defaults to False.
+    """
+
+    if jobs > 1 and len(pages) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(_render_page_image, builder, _df_list, [el.name for el in _df_list], kwargs, dpi, fast)
+                       for builder, _df_list, kwargs in pages]
+            figures = [_image_figure(*future.result()) for future in futures]
+    else:
+        figures = [build_page(page, fast=fast) for page in pages]
+
+    write_pdf(figures, output_pdf)
+
+
+def write_pdf(figures, output_pdf):
+    """Write figures, in order, in a PDF document
+
+    Args:
+        figures (list): The figures, one per page
+        output_pdf (str): Path to the PDF document
+    """
+
+    doc = PdfPages(output_pdf)
+    for figure in figures:
+        figure.savefig(doc, format='pdf')
+    doc.close()
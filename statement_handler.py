@@ -1,74 +1,227 @@
 #! /usr/bin/env python3
 
 import os
+import re
+import functools
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import pandas as pd
 import bank_name
+import instrument
 
+# Declarative description of each bank's csv export. See register_bank()
+BANK_SCHEMAS = {}
 
-def parse_statement(csv_file):
+# Kinds of account a statement can be issued for
+CREDIT_CARD = "credit_card"
+CHECKING = "checking"
+
+
+def register_bank(name, columns, date_format, spending_sign, sniff, account=CREDIT_CARD):
+    """Describe the csv export of a bank so that its statements can be detected and parsed
+
+    Args:
+        name (str): The bank name, as listed in bank_name
+        columns (dict): [key] = column index in the csv file; [value] = 'date', 'place' or 'amount'
+        date_format (str): strftime format of the 'date' column
+        spending_sign (int): 1 if the spendings are listed as positive values and the incomes as negative ones, -1 otherwise
+        sniff (str): Regular expression matching the first line of the bank's statements
+        account (str, optional): CREDIT_CARD or CHECKING. Defaults to CREDIT_CARD.
+    """
+
+    BANK_SCHEMAS[name] = {'columns': columns,
+                          'date_format': date_format,
+                          'spending_sign': spending_sign,
+                          'sniff': re.compile(sniff),
+                          'account': account}
+
+
+# 5/21/2018,"TIM HORTONS #0335        KAMLOOPS     BC ",-2.51
+register_bank(bank_name.SCOTIABANK,
+              columns={0: 'date', 1: 'place', 2: 'amount'},
+              date_format='%m/%d/%Y',
+              spending_sign=-1,
+              sniff=r'^\d{1,2}/\d{1,2}/\d{4},(?!-?[\d.]+,)')  # the second field is a place, never a number
+
+# 1,'5191230',20180521,20180522,2.51,TIM HORTONS #0335 KAMLOOPS BC
+register_bank(bank_name.BMO,
+              columns={2: 'date', 4: 'amount', 5: 'place'},
+              date_format='%Y%m%d',
+              spending_sign=1,
+              sniff=r'^[^,]*,[^,]*,\d{8},\d{8},')
+
+# 5/22/2018,-250.00,-,Bill Payment,"SCOTIABANK VISA"
+register_bank(bank_name.SCOTIABANK_CHECKING,
+              columns={0: 'date', 1: 'amount', 4: 'place'},
+              date_format='%m/%d/%Y',
+              spending_sign=-1,
+              sniff=r'^\d{1,2}/\d{1,2}/\d{4},-?[\d.]+,',
+              account=CHECKING)
+
+
+@instrument.profiled
+def parse_statement(csv_file, credits=False):
     """Parse the given statement and apply needed modification
 
     Args:
         csv_file (str): Path to csv file to parse
+        credits (bool, optional): Also return the money credited to the account. Defaults to False.
 
     Returns:
-        pandas.core.frame.DataFrame: A parsed and organized dataframe for the given statement
+        pandas.core.frame.DataFrame: A parsed and organized dataframe for the given statement. A tuple (spendings, credits) with credits
     """
 
-    if bank_name.SCOTIABANK in csv_file:
-        return extract_scotiabank_cc(csv_file)
-    elif bank_name.BMO in csv_file:
-        return extract_bmo_cc(csv_file)
-    else:
-        raise("file type not handled")
+    return extract_statement(csv_file, detect_bank(csv_file), credits)
+
+
+def detect_bank(csv_file):
+    """Find out which bank issued the given statement by looking at its first line. Falls back on the bank name in the file path
+
+    Args:
+        csv_file (str): Path to csv file to parse
+
+    Raises:
+        ValueError: If the statement is from a bank that is not handled
+
+    Returns:
+        str: The bank name, as listed in bank_name
+    """
+
+    first_line = ''
+    with open(csv_file, 'r', encoding='utf-8-sig', errors='replace') as file:
+        for line in file:
+            if line.strip():
+                first_line = line.strip()
+                break
+
+    for name, schema in BANK_SCHEMAS.items():
+        if schema['sniff'].search(first_line):
+            return name
+
+    for name in BANK_SCHEMAS:
+        if name in csv_file.lower():
+            return name
+
+    raise ValueError(f"{os.path.basename(csv_file)}: file type not handled")
 
 
-# def extract_checking(csv_file):
-#     checking = pd.read_csv(filepath_or_buffer=csv_file, sep=',', names=[ "date", "amount", "null", "type", "place" ], keep_default_na=False)
-#     return checking
+def _parse_statement_safely(csv_file, credits=False):
+    try:
+        return csv_file, parse_statement(csv_file, credits), None
+    except Exception as error:
+        # Report the error as a string: not all exceptions can be sent back from a worker process
+        return csv_file, None, f"{type(error).__name__}: {error}"
 
 
-def extract_scotiabank_cc(csv_file):
-    """Parse the given Scotiabank statement and apply needed modification
+@instrument.profiled
+def parse_statements(csv_files, jobs=1, use_threads=False, credits=False):
+    """Parse several statements, spread over a pool of workers when jobs > 1
+
+    A statement that cannot be parsed is reported and skipped, it does not stop the others from being parsed.
 
     Args:
-        csv_file (str): Path to csv file to parse
+        csv_files (list): Path to the csv files to parse
+        jobs (int, optional): Number of statements parsed at the same time. Defaults to 1.
+        use_threads (bool, optional): Use threads instead of processes, for when reading the files is the bottleneck. Defaults to False.
+        credits (bool, optional): Parse the credits too, see parse_statement(). Defaults to False.
 
     Returns:
-        pandas.core.frame.DataFrame: A parsed and organized dataframe for the given statement
+        tuple: (list of (csv_file, dataframe) in the same order as csv_files, list of (csv_file, error message))
     """
 
-    scotia_df = pd.read_csv(filepath_or_buffer=csv_file, sep=',', names=["date", "place", "amount"], keep_default_na=False)
-    scotia_df['date'] = pd.to_datetime(scotia_df['date'], format='%m/%d/%Y', errors='coerce')
-    scotia_df = remove_cc_income(scotia_df, bank_name.SCOTIABANK)
-    if scotia_df.empty:
-        print(f"It seems your CSV file content is either empty or does not contain any debit on your credit history. \
-        \nPlease check the content of {os.path.basename(csv_file)}")
-        return scotia_df
-    scotia_df = spending_as_pos_value(scotia_df, bank_name.SCOTIABANK)
+    for csv_file in csv_files:
+        print(f"Read CSV file {os.path.basename(csv_file)}...")
+
+    parse = functools.partial(_parse_statement_safely, credits=credits)
+    if jobs > 1 and len(csv_files) > 1:
+        executor_class = ThreadPoolExecutor if use_threads else ProcessPoolExecutor
+        with executor_class(max_workers=jobs) as executor:
+            results = list(executor.map(parse, csv_files))  # map() keeps the order of csv_files
+    else:
+        results = [parse(csv_file) for csv_file in csv_files]
 
-    return scotia_df
+    parsed = [(csv_file, statement_df) for csv_file, statement_df, error in results if error is None]
+    errors = [(csv_file, error) for csv_file, _, error in results if error is not None]
+    for csv_file, error in errors:
+        print(f"** ERROR ** Could not parse {os.path.basename(csv_file)}: {error}")
 
+    return parsed, errors
 
-def extract_bmo_cc(csv_file):
-    """Parse the given BMO statement and apply needed modification
+
+def _read_statement(csv_file, schema, chunksize=None):
+    columns = schema['columns']
+    dtypes = {'date': str, 'place': str, 'amount': 'float64'}
+    return pd.read_csv(filepath_or_buffer=csv_file, sep=',', header=None, usecols=sorted(columns),
+                       dtype={index: dtypes[name] for index, name in columns.items()}, keep_default_na=False,
+                       chunksize=chunksize)
+
+
+def _name_columns(statement_df, schema):
+    statement_df = statement_df.rename(columns=schema['columns'])[['date', 'place', 'amount']]
+    statement_df['date'] = pd.to_datetime(statement_df['date'], format=schema['date_format'], errors='coerce')
+    return statement_df
+
+
+def extract_statement(csv_file, bankName, credits=False):
+    """Parse the given statement according to its bank's schema
+
+    The whole statement is read with a single read_csv call, only reading the needed columns with their final type.
 
     Args:
         csv_file (str): Path to csv file to parse
+        bankName (str): The bank name, as registered with register_bank()
+        credits (bool, optional): Also return the money credited to the account (payments, transfers, incomes). Defaults to False.
 
     Returns:
-        pandas.core.frame.DataFrame: A parsed and organized dataframe for the given statement
+        pandas.core.frame.DataFrame: A parsed and organized dataframe for the given statement. With credits, a tuple
+            (spendings, credits) both listed as positive values
     """
 
-    bmo_df = pd.read_csv(filepath_or_buffer=csv_file, sep=',', usecols=[2, 4, 5], names=["date", "amount", "place"], keep_default_na=False)
-    bmo_df['date'] = pd.to_datetime(bmo_df['date'], format='%Y%m%d', errors='coerce')
-    bmo_df = remove_cc_income(bmo_df, bank_name.BMO)
-    if bmo_df.empty:
+    schema = BANK_SCHEMAS[bankName]
+    all_df = _name_columns(_read_statement(csv_file, schema), schema)
+
+    statement_df = remove_cc_income(all_df, bankName)
+    if statement_df.empty:
         print(f"It seems your CSV file content is either empty or does not contain any debit on your credit history. \
         \nPlease check the content of {os.path.basename(csv_file)}")
-        return bmo_df
-    bmo_df = spending_as_pos_value(bmo_df, bank_name.BMO)
-    return bmo_df
+    else:
+        statement_df = spending_as_pos_value(statement_df, bankName)
+
+    if credits:
+        return statement_df, extract_credits(all_df, bankName)
+    return statement_df
+
+
+def iter_statement_chunks(csv_files, chunksize, credits=False):
+    """Parse the given statements chunk by chunk so that they are never held whole in memory
+
+    A statement that cannot be parsed is reported and skipped, the chunks it already yielded are kept.
+
+    Args:
+        csv_files (list): Path to the csv files to parse
+        chunksize (int): Maximum number of lines parsed at once
+        credits (bool, optional): Also yield the money credited to the account, and tell the 'bank' and 'source' of
+            every row, as the transaction store does. Defaults to False.
+
+    Yields:
+        pandas.core.frame.DataFrame: The parsed spendings of the next chunk of statement. With credits, a tuple
+            (spendings, credits) both listed as positive values
+    """
+
+    for csv_file in csv_files:
+        print(f"Read CSV file {os.path.basename(csv_file)}...")
+        try:
+            bankName = detect_bank(csv_file)
+            schema = BANK_SCHEMAS[bankName]
+            for chunk in _read_statement(csv_file, schema, chunksize=chunksize):
+                all_df = _name_columns(chunk, schema)
+                statement_df = spending_as_pos_value(remove_cc_income(all_df, bankName), bankName)
+                if credits:
+                    yield (statement_df.assign(bank=bankName, source=csv_file),
+                           extract_credits(all_df, bankName).assign(bank=bankName, source=csv_file))
+                else:
+                    yield statement_df
+        except Exception as error:
+            print(f"** ERROR ** Could not parse {os.path.basename(csv_file)}: {type(error).__name__}: {error}")
 
 
 def remove_cc_income(credit_card_pd, bankName):
@@ -76,19 +229,31 @@ def remove_cc_income(credit_card_pd, bankName):
 
     Args:
         credit_card_pd (pandas.core.frame.DataFrame): The dataframe to modify
+        bankName (str): The bank name, as registered with register_bank()
 
     Returns:
         pandas.core.frame.DataFrame: A dataframe with all the income removed
     """
 
     print("Parsing: Remove income")
-    if bankName == bank_name.SCOTIABANK:
-        credit_card_pd = credit_card_pd[credit_card_pd.amount < 0]
+    spending_sign = BANK_SCHEMAS[bankName]['spending_sign']
+    return credit_card_pd[credit_card_pd.amount * spending_sign > 0]
 
-    elif bankName == bank_name.BMO:
-        credit_card_pd = credit_card_pd[credit_card_pd.amount > 0]
 
-    return credit_card_pd
+def extract_credits(statement_df, bankName):
+    """Keep the money credited to the account (credit card payments, transfers, incomes) as positive values
+
+    Args:
+        statement_df (pandas.core.frame.DataFrame): The parsed statement
+        bankName (str): The bank name, as registered with register_bank()
+
+    Returns:
+        pandas.core.frame.DataFrame: The credits, listed as positive values
+    """
+
+    spending_sign = BANK_SCHEMAS[bankName]['spending_sign']
+    credits_df = statement_df[statement_df.amount * spending_sign < 0]
+    return credits_df.assign(amount=credits_df['amount'].abs())
 
 
 def spending_as_pos_value(credit_card_pd, bankName):
@@ -96,18 +261,14 @@ def spending_as_pos_value(credit_card_pd, bankName):
 
     Args:
         credit_card_pd (pandas.core.frame.DataFrame): The dataframe to modify
+        bankName (str): The bank name, as registered with register_bank()
 
     Returns:
         pandas.core.frame.DataFrame: A dataframe with all the spending entries listed as positive value
     """
 
     print("Parsing: Spending as positive value")
-
-    if bankName == bank_name.SCOTIABANK:
-        credit_card_pd['amount'] = credit_card_pd['amount'].apply(lambda x: -x)
-    elif bankName == bank_name.BMO:
-        # BMO spendings are already in positive
-        pass
-    else:
-        credit_card_pd['amount'] = credit_card_pd['amount'].apply(lambda x: -x)
+    spending_sign = BANK_SCHEMAS[bankName]['spending_sign']
+    if spending_sign < 0:
+        credit_card_pd = credit_card_pd.assign(amount=-credit_card_pd['amount'])
     return credit_card_pd
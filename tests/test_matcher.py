@@ -0,0 +1,52 @@
+import random
+import category
+import category_name
+import matcher
+import organizer
+
+# Overlapping keywords (a keyword inside another one, sharing a prefix or a suffix), regular expression keywords and a
+# priority 0 keyword, so that the automaton's failure links and its early exit are exercised
+CATEGORIES = [('coffee', ['tim hortons', 'he', 'Starbucks']),
+              ('bar', [r'\bpub\b', 'hers', 'she']),
+              ('restaurant', ['tim', 'ortons', 'h.rs']),
+              ('transport', ['^uber', 'his', 'evo car'])]
+
+PLACES = ['TIM HORTONS #0335 KAMLOOPS BC', 'tim hortonz', 'ushers', 'she', 'shis', 'this', 'hers pub', 'public house',
+          'the pub', 'UBER TRIP', 'trip uber', 'evo car share', 'evo cars', 'hrrs', 'harsh', 'starbucks he', 'xx', '']
+
+
+def alternation(categories, default):
+    # The reference: the first category, in priority order, whose keywords alternation matches
+    patterns = [(name, organizer.compile_category(keywords)) for name, keywords in categories]
+    return lambda place: next((name for name, pattern in patterns if pattern.search(place)), default)
+
+
+def test_category_matcher_classifies_like_the_keywords_alternation():
+    category_matcher = matcher.CategoryMatcher(CATEGORIES, category_name.MISC)
+    expected = alternation(CATEGORIES, category_name.MISC)
+
+    for place in PLACES:
+        assert category_matcher.classify(place) == expected(place), place
+
+
+def test_category_matcher_classifies_random_places_like_the_keywords_alternation():
+    generator = random.Random(0)
+    categories = [(str(priority), [''.join(generator.choice('abc') for _ in range(generator.randint(1, 4)))
+                                   for _ in range(3)] + (['^b.a'] if priority == 2 else []))
+                  for priority in range(5)]
+    category_matcher = matcher.CategoryMatcher(categories, category_name.MISC)
+    expected = alternation(categories, category_name.MISC)
+
+    for _ in range(2000):
+        place = ''.join(generator.choice('abcd') for _ in range(generator.randint(0, 12)))
+        assert category_matcher.classify(place) == expected(place), place
+
+
+def test_tree_matcher_classifies_like_the_category_tree_alternation():
+    labels, leaves = matcher.flatten_tree(category.Tree, category_name.MISC)
+    tree_matcher = matcher.get_tree_matcher(category.Tree, category_name.MISC)
+    expected = alternation(list(zip(labels, leaves)), labels[-1])
+
+    places = [keyword for leaf in leaves for keyword in leaf if matcher.is_literal(keyword)]
+    for place in places + [f"{place} vancouver bc" for place in places] + PLACES:
+        assert tree_matcher.classify(place.lower()) == expected(place.lower()), place
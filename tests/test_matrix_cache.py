@@ -0,0 +1,78 @@
+import copy
+import os
+import pytest
+import category
+import category_name
+import matrix_cache
+import transaction_store
+
+STATEMENTS = {'2019.csv': ['1/3/2019,"IGA VANCOUVER BC",-40.10', '1/9/2019,"FOO BAR STORE VANCOUVER BC",-12.00',
+                           '2/14/2019,"SAVARY ISLAND PIE VANCOUVER BC",-8.25', '3/2/2019,"UBER TRIP VANCOUVER BC",-23.50',
+                           '3/2/2019,"PAYMENT",500.00'],
+              '2020.csv': ['1/5/2020,"IGA VANCOUVER BC",-61.00', '2/7/2020,"EVO CAR SHARE VANCOUVER BC",-17.75',
+                           '2/8/2020,"FOO BAR STORE VANCOUVER BC",-5.00']}
+
+
+def write_statement(folder, name, lines, mtime):
+    path = os.path.join(folder, name)
+    with open(path, 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+    os.utime(path, (mtime, mtime))  # an edit is noticed even within the resolution of the file system's clock
+    return path
+
+
+def update(store, folder):
+    files = sorted(os.path.join(folder, name) for name in os.listdir(folder))
+    transaction_store.update_store(store, files)
+    transaction_store.categorise_store(store)
+
+
+def fresh_matrices(folder):
+    store = transaction_store.empty_store()
+    update(store, folder)
+    return matrix_cache.monthly_matrices(matrix_cache.empty_cache(), store)
+
+
+def edit_tree(edit):
+    tree = copy.deepcopy(category.Tree)
+    leaves = {name: keywords for name, keywords, _, _ in tree}
+    edit(leaves)
+    return tree
+
+
+KEYWORD_EDITS = {'add': lambda leaves: leaves[category_name.GROCERIES].append('foo bar'),
+                 'remove': lambda leaves: leaves[category_name.GROCERIES].remove('iga'),
+                 'move': lambda leaves: (leaves[category_name.COFFEE].remove('pie'), leaves[category_name.GROCERIES].append('pie'))}
+
+
+def modify_statement(folder):
+    write_statement(folder, '2019.csv', STATEMENTS['2019.csv'][:2] + ['4/1/2019,"IGA VANCOUVER BC",-9.99'], 2000)
+
+
+def delete_statement(folder):
+    os.remove(os.path.join(folder, '2020.csv'))
+
+
+@pytest.mark.parametrize('change', ['keywords ' + name for name in KEYWORD_EDITS] + ['modified statement', 'deleted statement'])
+def test_cached_matrices_are_the_fresh_ones_after_a_change(tmp_path, monkeypatch, change):
+    folder = str(tmp_path)
+    for mtime, (name, lines) in enumerate(STATEMENTS.items(), start=1000):
+        write_statement(folder, name, lines, mtime)
+
+    store, cache = transaction_store.empty_store(), matrix_cache.empty_cache()
+    update(store, folder)
+    before = matrix_cache.monthly_matrices(cache, store)
+
+    if change.startswith('keywords '):
+        monkeypatch.setattr(category, 'Tree', edit_tree(KEYWORD_EDITS[change.split()[1]]))
+    elif change == 'modified statement':
+        modify_statement(folder)
+    else:
+        delete_statement(folder)
+    update(store, folder)
+    cached = matrix_cache.monthly_matrices(cache, store)
+    fresh = fresh_matrices(folder)
+
+    assert not all(matrix.equals(other) for matrix, other in zip(before, fresh)), "the change must change the matrices"
+    for matrix, expected in zip(cached, fresh):
+        assert matrix.equals(expected)
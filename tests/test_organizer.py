@@ -0,0 +1,20 @@
+import pandas as pd
+import category
+import category_name
+import organizer
+
+
+def test_recategorisation_candidates_match_places_with_runs_of_spaces(monkeypatch):
+    old_tree = category.Tree
+    name, keywords, sub_categories, default_sub_category = old_tree[0]
+    assert name == category_name.GROCERIES
+    new_tree = [(name, keywords + ['foo bar'], sub_categories, default_sub_category)] + old_tree[1:]
+    monkeypatch.setattr(category, 'Tree', new_tree)
+
+    transactions = pd.DataFrame({'place': ['FOO BAR STORE    VANCOUVER BC', 'FOO    BAR STORE VANCOUVER BC'],
+                                 'category': [category_name.MISC, category_name.MISC],
+                                 'sub_category': [category_name.MISC, category_name.MISC]})
+
+    candidates = organizer.recategorisation_candidates(transactions, old_tree)
+
+    assert candidates.tolist() == [True, True]
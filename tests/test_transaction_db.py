@@ -0,0 +1,55 @@
+import copy
+import os
+import category
+import category_name
+import transaction_db
+import transaction_store
+
+STATEMENTS = {'CreditCard/2019.csv': ['1/3/2019,"IGA VANCOUVER BC",-40.10', '1/9/2019,"FOO BAR STORE VANCOUVER BC",-12.00',
+                                      '3/2/2019,"UBER TRIP VANCOUVER BC",-23.50', '3/4/2019,"PAYMENT",250.00'],
+              'Checking/chequing/2019.csv': ['3/2/2019,-250.00,-,Bill Payment,SCOTIABANK VISA',
+                                             '3/6/2019,-31.00,-,Debit,FOO BAR STORE VANCOUVER BC']}
+
+
+def write_statements(folder):
+    files = []
+    for name, lines in STATEMENTS.items():
+        path = os.path.join(folder, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+        files.append(path)
+    return files
+
+
+def store_totals(files):
+    store = transaction_store.empty_store()
+    transaction_store.update_store(store, files)
+    transaction_store.categorise_store(store)
+    spendings = transaction_store.spendings(store)
+    return sorted(spendings.groupby(['category', 'sub_category'], observed=True)['amount'].sum().round(2).items())
+
+
+def database_totals(connection):
+    return sorted(transaction_db.category_totals(connection)['amount'].round(2).items())
+
+
+def test_database_is_the_transaction_store(tmp_path, monkeypatch):
+    files = write_statements(str(tmp_path))
+    connection = transaction_db.connect(str(tmp_path / 'transactions.sqlite'))
+
+    assert transaction_db.sync_statements(connection, files) == files
+    assert database_totals(connection) == store_totals(files)
+    assert transaction_db.spendings_count(connection) == 4  # the credit card payment is not a spending
+    assert transaction_db.sync_statements(connection, files) == []
+
+    tree = copy.deepcopy(category.Tree)
+    next(keywords for name, keywords, _, _ in tree if name == category_name.GROCERIES).append('foo bar')
+    monkeypatch.setattr(category, 'Tree', tree)
+    transaction_db.sync_statements(connection, files)
+    assert dict(database_totals(connection))[(category_name.GROCERIES, category_name.GROCERIES)] == 83.1
+    assert database_totals(connection) == store_totals(files)
+
+    os.remove(files[1])
+    assert transaction_db.sync_statements(connection, files[:1]) == files[1:]
+    assert database_totals(connection) == store_totals(files[:1])
@@ -0,0 +1,31 @@
+import os
+import query
+import transaction_store
+
+
+def write_statement(folder, name, lines):
+    path = os.path.join(folder, name)
+    with open(path, 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+    return path
+
+
+def test_store_is_kept_in_date_order(tmp_path):
+    folder = str(tmp_path)
+    files = [write_statement(folder, 'scotiabank.csv', ['3/2/2019,"UBER TRIP VANCOUVER BC",-23.50', '1/3/2019,"IGA VANCOUVER BC",-40.10']),
+             write_statement(folder, 'bmo.csv', ["0,'5191230',20190209,20190209,8.25,SAVARY ISLAND PIE VANCOUVER BC"])]
+    store = transaction_store.empty_store()
+    transaction_store.update_store(store, files)
+    assert store['transactions']['date'].is_monotonic_increasing
+
+    # A new statement is merged into the spendings already in order
+    files.append(write_statement(folder, 'bmo_2018.csv', ["0,'5191230',20181209,20181209,5.00,IGA VANCOUVER BC",
+                                                          "1,'5191230',20190301,20190301,7.00,IGA VANCOUVER BC"]))
+    transaction_store.update_store(store, files)
+    transactions = store['transactions']
+    assert transactions['date'].is_monotonic_increasing
+    assert transactions['amount'].tolist() == [5.0, 40.1, 8.25, 7.0, 23.5]
+
+    index = query.DateIndex(transactions)
+    assert index.spendings['amount'].tolist() == transactions['amount'].tolist()
+    assert index.between(*query.period_bounds('2019-02', '2019-03'))['amount'].tolist() == [8.25, 7.0, 23.5]
@@ -0,0 +1,50 @@
+import pandas as pd
+import overview
+import transaction_store
+import transfers
+
+
+def spendings(bank, source, date='2025-01-31', amount=100.0):
+    return pd.DataFrame({'date': pd.to_datetime([date]), 'amount': [amount], 'bank': [bank], 'source': [source]})
+
+
+def test_match_transfers_ignores_two_statements_of_a_same_account():
+    withdrawals = spendings('scotiabank_checking', 'statements/Checking/jan.csv')
+    credits = spendings('scotiabank_checking', 'statements/Checking/feb.csv', date='2025-02-02')
+
+    assert transfers.match_transfers(withdrawals, credits).tolist() == [False]
+
+
+def test_match_transfers_matches_two_accounts_of_a_same_bank():
+    withdrawals = spendings('scotiabank_checking', 'statements/Checking/chequing/jan.csv', amount=500.0)
+    credits = spendings('scotiabank_checking', 'statements/Checking/savings/jan.csv', amount=500.0)
+
+    assert transfers.match_transfers(withdrawals, credits).tolist() == [True]
+
+
+def test_match_transfers_matches_a_credit_card_payment():
+    withdrawals = spendings('scotiabank_checking', 'statements/Checking/jan.csv')
+    credits = spendings('bmo', 'statements/CreditCard/feb.csv', date='2025-02-02')
+
+    assert transfers.match_transfers(withdrawals, credits).tolist() == [True]
+
+
+def test_statement_folders_hold_one_account_each(tmp_path):
+    for folder in ('CreditCard', 'Checking/chequing', 'Checking/savings'):
+        (tmp_path / folder).mkdir(parents=True)
+    for file in ('CreditCard/jan.csv', 'Checking/chequing/jan.csv', 'Checking/savings/jan.csv', 'Checking/notes.txt'):
+        (tmp_path / file).write_text('')
+
+    csv_files, checking_files = overview.statement_files(str(tmp_path))
+
+    assert csv_files == [f"{tmp_path}/CreditCard/jan.csv"]
+    assert checking_files == [f"{tmp_path}/Checking/chequing/jan.csv", f"{tmp_path}/Checking/savings/jan.csv"]
+
+
+def test_stream_spendings_matches_the_transfers_once_every_credit_is_read():
+    chunks = [(spendings('scotiabank_checking', 'statements/Checking/jan.csv'), spendings('bmo', 'statements/CreditCard/jan.csv').iloc[:0]),
+              (spendings('bmo', 'statements/CreditCard/jan.csv', amount=12.5), spendings('bmo', 'statements/CreditCard/jan.csv'))]
+
+    streamed = list(transaction_store.stream_spendings(chunks))
+
+    assert [chunk['amount'].tolist() for chunk in streamed] == [[], [12.5], []]
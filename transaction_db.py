@@ -0,0 +1,378 @@
+#! /usr/bin/env python3
+
+import os
+import json
+import sqlite3
+import numpy as np
+import pandas as pd
+import statement_handler as sh
+import category
+import category_name
+import instrument
+import organizer
+import transaction_store
+import transfers
+from merchant_cache import keywords_fingerprint
+
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    merchant TEXT NOT NULL,
+    cents INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    sub_category TEXT NOT NULL,
+    bank TEXT,
+    source TEXT NOT NULL,
+    duplicate INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS transactions_date ON transactions (date);
+CREATE INDEX IF NOT EXISTS transactions_category_date ON transactions (category, date);
+CREATE INDEX IF NOT EXISTS transactions_merchant ON transactions (merchant);
+CREATE INDEX IF NOT EXISTS transactions_source ON transactions (source);
+CREATE INDEX IF NOT EXISTS transactions_bank ON transactions (bank);
+CREATE TABLE IF NOT EXISTS credits (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    cents INTEGER NOT NULL,
+    bank TEXT,
+    source TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS credits_source ON credits (source);
+CREATE TABLE IF NOT EXISTS sources (
+    source TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def connect(database_file):
+    """Open the transaction database, creating its tables and indexes if needed
+
+    A database of another schema version is emptied: it is rebuilt from the statements on the next sync.
+
+    Args:
+        database_file (str): Path to the SQLite database
+
+    Returns:
+        sqlite3.Connection: The connection
+    """
+
+    connection = sqlite3.connect(database_file)
+    version = connection.execute("PRAGMA user_version").fetchone()[0]
+    if version != SCHEMA_VERSION:
+        if version != 0:
+            print(f"Rebuild {database_file}: schema version {version}, expected {SCHEMA_VERSION}")
+        connection.executescript("DROP TABLE IF EXISTS transactions; DROP TABLE IF EXISTS credits; "
+                                 "DROP TABLE IF EXISTS sources; DROP TABLE IF EXISTS settings;")
+    connection.executescript(SCHEMA)
+    connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return connection
+
+
+def _dates(transactions):
+    # ISO dates: compared as text they are in chronological order
+    return transactions['date'].values.astype('datetime64[D]').astype(str).tolist()
+
+
+def _rows(transactions):
+    # Normalised as SQLite values: ISO dates, integer cents, plain strings
+    return zip(_dates(transactions),
+               transactions['place'].astype(str).tolist(),
+               organizer.amount_cents(transactions).tolist(),
+               transactions['category'].astype(str).tolist(),
+               transactions['sub_category'].astype(str).tolist(),
+               transactions['bank'].astype(object).where(transactions['bank'].notna(), None).tolist(),
+               transactions['source'].astype(str).tolist())
+
+
+def _credit_rows(credits):
+    return zip(_dates(credits), organizer.amount_cents(credits).tolist(), credits['bank'].tolist(), credits['source'].tolist())
+
+
+def _setting(connection, name):
+    row = connection.execute("SELECT value FROM settings WHERE name = ?", (name,)).fetchone()
+    return None if row is None else json.loads(row[0])
+
+
+def _set_setting(connection, name, value):
+    connection.execute("INSERT OR REPLACE INTO settings (name, value) VALUES (?, ?)", (name, json.dumps(value)))
+
+
+@instrument.profiled
+def sync_statements(connection, csv_files, jobs=1, use_threads=False):
+    """Bring the database up to date with the statements: the database is then the transaction store
+
+    Like transaction_store.update_store(), only the statements that are new or have changed since the last sync are
+    parsed, their spendings categorised and inserted in bulk, all in a single database transaction: an interrupted sync
+    leaves the database as it was. The spendings already in the database are never loaded, see recategorise() and
+    flag_duplicates() for the few rows they read.
+
+    Args:
+        connection (sqlite3.Connection): The database, see connect()
+        csv_files (list): Path to all the statements that should be in the database
+        jobs (int, optional): Number of statements parsed at the same time. Defaults to 1.
+        use_threads (bool, optional): Parse with threads instead of processes. Defaults to False.
+
+    Returns:
+        list: The statements whose spendings have been added, replaced or removed
+    """
+
+    known = {source: (size, mtime, file_hash) for source, size, mtime, file_hash in connection.execute("SELECT * FROM sources")}
+    removed = [source for source in known if source not in csv_files]
+    touched = []
+    to_parse = {}
+    for csv_file in csv_files:
+        stat = os.stat(csv_file)
+        signature = known.get(csv_file)
+        if signature is not None and signature[:2] == (stat.st_size, stat.st_mtime):
+            continue
+        file_hash = transaction_store.file_hash(csv_file)
+        if signature is not None and signature[2] == file_hash:
+            touched.append((csv_file, stat.st_size, stat.st_mtime, file_hash))
+        else:
+            to_parse[csv_file] = (csv_file, stat.st_size, stat.st_mtime, file_hash)
+
+    # A statement that fails to parse keeps its previous spendings and will be parsed again on the next sync
+    parsed, _ = sh.parse_statements(list(to_parse), jobs=jobs, use_threads=use_threads, credits=True)
+    changed = [csv_file for csv_file, _ in parsed]
+
+    with connection:
+        recategorise(connection)
+
+        if changed:
+            print(f"Write the spendings of {len(changed)} statements into the transaction database")
+        for source in changed + removed:
+            connection.execute("DELETE FROM transactions WHERE source = ?", (source,))
+            connection.execute("DELETE FROM credits WHERE source = ?", (source,))
+        connection.executemany("DELETE FROM sources WHERE source = ?", [(source,) for source in removed])
+        for csv_file, (statement_df, credits_df) in parsed:
+            bank = sh.detect_bank(csv_file)
+            categories, sub_categories = organizer.tree_labels(statement_df['place'])
+            connection.executemany("INSERT INTO transactions (date, merchant, cents, category, sub_category, bank, source) "
+                                   "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                   _rows(statement_df.assign(category=categories, sub_category=sub_categories, bank=bank, source=csv_file)))
+            connection.executemany("INSERT INTO credits (date, cents, bank, source) VALUES (?, ?, ?, ?)",
+                                   _credit_rows(credits_df.assign(bank=bank, source=csv_file)))
+        connection.executemany("INSERT OR REPLACE INTO sources (source, size, mtime, hash) VALUES (?, ?, ?, ?)",
+                               touched + [to_parse[csv_file] for csv_file in changed])
+
+        if changed or removed:
+            flag_duplicates(connection)
+        else:
+            print("Transaction database is up to date")
+
+    return changed + removed
+
+
+def recategorise(connection):
+    """Categorise again the spendings whose category may have changed since category.py was edited
+
+    Only the distinct (merchant, category, sub category) of the database are read, see
+    organizer.recategorisation_candidates()
+
+    Args:
+        connection (sqlite3.Connection): The database, see connect()
+
+    Returns:
+        int: The number of spendings that changed category
+    """
+
+    keywords = keywords_fingerprint()
+    if _setting(connection, 'keywords') == keywords:
+        return 0
+
+    labels = pd.DataFrame.from_records(connection.execute("SELECT DISTINCT merchant, category, sub_category FROM transactions").fetchall(),
+                                       columns=['place', 'category', 'sub_category'])
+    old_tree = _setting(connection, 'tree')
+    candidates = None if old_tree is None else organizer.recategorisation_candidates(labels, old_tree)
+    if candidates is not None:
+        labels = labels[candidates]
+
+    updated = 0
+    if not labels.empty:
+        categories, sub_categories = organizer.tree_labels(labels['place'])
+        changed = (labels['category'].values != categories) | (labels['sub_category'].values != sub_categories)
+        updates = list(zip(categories[changed], sub_categories[changed], *(labels[column].values[changed]
+                                                                            for column in ('place', 'category', 'sub_category'))))
+        for update in updates:
+            updated += connection.execute("UPDATE transactions SET category = ?, sub_category = ? "
+                                          "WHERE merchant = ? AND category = ? AND sub_category = ?", update).rowcount
+        print(f"Categorise again {len(labels)} merchants of the transaction database, {updated} spendings changed category")
+
+    _set_setting(connection, 'keywords', keywords)
+    _set_setting(connection, 'tree', category.Tree)
+    return updated
+
+
+def flag_duplicates(connection):
+    """Flag the checking account spendings that only move money to another account, see transaction_store.flag_duplicates()
+
+    Only the checking account spendings and the credits are read.
+
+    Args:
+        connection (sqlite3.Connection): The database, see connect()
+    """
+
+    checking_banks = [bank for bank, schema in sh.BANK_SCHEMAS.items() if schema['account'] == sh.CHECKING]
+    banks = ', '.join('?' * len(checking_banks))
+    withdrawals = pd.DataFrame.from_records(
+        connection.execute(f"SELECT id, date, cents, bank, source FROM transactions WHERE bank IN ({banks}) ORDER BY source, id",
+                           checking_banks).fetchall(), columns=['id', 'date', 'cents', 'bank', 'source'])
+    credits = pd.DataFrame.from_records(connection.execute("SELECT date, cents, bank, source FROM credits ORDER BY source, id").fetchall(),
+                                        columns=['date', 'cents', 'bank', 'source'])
+    for frame in (withdrawals, credits):
+        frame['date'] = pd.to_datetime(frame['date'])
+        frame['amount'] = frame['cents'] / 100
+
+    duplicate = transfers.match_transfers(withdrawals, credits)
+    connection.execute(f"UPDATE transactions SET duplicate = 0 WHERE bank IN ({banks})", checking_banks)
+    connection.executemany("UPDATE transactions SET duplicate = 1 WHERE id = ?", [(int(row),) for row in withdrawals['id'].values[duplicate]])
+    if duplicate.any():
+        print(f"Ignore {duplicate.sum()} checking account spendings paying a credit card or moving money to another account")
+
+
+def _date_filter(start, end):
+    # Dates are ISO strings: compared as text they are in chronological order and use the date indexes
+    clauses, parameters = [], []
+    if start is not None:
+        clauses.append("date >= ?")
+        parameters.append(str(pd.Timestamp(start).date()))
+    if end is not None:
+        clauses.append("date <= ?")
+        parameters.append(str(pd.Timestamp(end).date()))
+    return clauses, parameters
+
+
+@instrument.profiled
+def monthly_totals(connection, column='category', category=None):
+    """Sum the spendings by month and by category (or sub category) in SQL
+
+    Args:
+        connection (sqlite3.Connection): The database, see connect()
+        column (str, optional): 'category' or 'sub_category'. Defaults to 'category'.
+        category (str, optional): Only sum the spendings of this category. Defaults to None.
+
+    Raises:
+        ValueError: If column is not a category column
+
+    Returns:
+        pandas.core.frame.DataFrame: Monthly totals, like organizer.monthly_totals_by() returns them
+    """
+
+    if column not in ('category', 'sub_category'):
+        raise ValueError(f"Cannot sum the spendings by {column}")
+
+    where = "WHERE duplicate = 0" + (" AND category = ?" if category is not None else "")
+    rows = connection.execute(f"SELECT substr(date, 1, 7) AS month, {column}, SUM(cents) FROM transactions {where} "
+                              f"GROUP BY month, {column}", [] if category is None else [category]).fetchall()
+    if not rows:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name='date'))
+
+    months, categories, cents = zip(*rows)
+    totals = pd.DataFrame({'date': pd.to_datetime(np.array(months, dtype='datetime64[M]')), column: categories, 'cents': cents})
+    return (totals.pivot(index='date', columns=column, values='cents').fillna(0) / 100).round(2)
+
+
+def monthly_matrices(connection):
+    """Get the month x category matrices of the report out of the database
+
+    Args:
+        connection (sqlite3.Connection): The database, see connect()
+
+    Returns:
+        tuple: The month x category matrix of the categories and the one of the transport sub categories
+    """
+
+    return (organizer.build_monthly_matrix(monthly_totals(connection, 'category')),
+            organizer.build_monthly_matrix(monthly_totals(connection, 'sub_category', category_name.TRANSPORT)))
+
+
+@instrument.profiled
+def category_spendings(connection, category, start=None, end=None):
+    """Get the spendings of a category, ordered by date, read in order out of the (category, date) index
+
+    Args:
+        connection (sqlite3.Connection): The database, see connect()
+        category (str): The category name
+        start (str, optional): First day, i.e: '2020-01-01'. Defaults to None.
+        end (str, optional): Last day. Defaults to None.
+
+    Returns:
+        pandas.core.frame.DataFrame: [date], [place], [amount] of the spendings
+    """
+
+    clauses, parameters = _date_filter(start, end)
+    where = " AND ".join(["category = ?", "duplicate = 0"] + clauses)
+    rows = connection.execute(f"SELECT date, merchant, cents FROM transactions WHERE {where} ORDER BY date",
+                              [category] + parameters).fetchall()
+    return _spendings_frame(rows)
+
+
+@instrument.profiled
+def spendings_between(connection, start=None, end=None):
+    """Get the spendings of a date range, ordered by date, read in order out of the (date) index
+
+    Args:
+        connection (sqlite3.Connection): The database, see connect()
+        start (str, optional): First day, i.e: '2020-01-01'. Defaults to None.
+        end (str, optional): Last day. Defaults to None.
+
+    Returns:
+        pandas.core.frame.DataFrame: [date], [place], [amount], [category] and [sub_category] of the spendings
+    """
+
+    clauses, parameters = _date_filter(start, end)
+    where = " AND ".join(["duplicate = 0"] + clauses)
+    rows = connection.execute(f"SELECT date, merchant, cents, category, sub_category FROM transactions WHERE {where} "
+                              "ORDER BY date", parameters).fetchall()
+    return _spendings_frame(rows, ['category', 'sub_category'])
+
+
+def spendings_count(connection):
+    """Count the spendings to account for
+
+    Args:
+        connection (sqlite3.Connection): The database, see connect()
+
+    Returns:
+        int: The number of spendings, duplicates aside
+    """
+
+    return connection.execute("SELECT COUNT(*) FROM transactions WHERE duplicate = 0").fetchone()[0]
+
+
+@instrument.profiled
+def category_totals(connection):
+    """Count and sum the spendings of each category and sub category in SQL
+
+    Args:
+        connection (sqlite3.Connection): The database, see connect()
+
+    Returns:
+        pandas.core.frame.DataFrame: [index] = (category, sub_category) in category.Tree order; [spendings] = number of
+            spendings; [amount] = total spent
+    """
+
+    rows = connection.execute("SELECT category, sub_category, COUNT(*), SUM(cents) FROM transactions WHERE duplicate = 0 "
+                              "GROUP BY category, sub_category").fetchall()
+    totals = pd.DataFrame.from_records(rows, columns=['category', 'sub_category', 'spendings', 'cents'])
+    totals['category'] = pd.Categorical(totals['category'], categories=organizer.CATEGORY_NAMES)
+    totals['sub_category'] = pd.Categorical(totals['sub_category'], categories=organizer.SUB_CATEGORY_NAMES)
+    totals['amount'] = totals.pop('cents') / 100
+    return totals.sort_values(['category', 'sub_category']).set_index(['category', 'sub_category'])
+
+
+def _spendings_frame(rows, extra_columns=()):
+    frame = pd.DataFrame.from_records(rows, columns=['date', 'place', 'cents'] + list(extra_columns))
+    frame['date'] = pd.to_datetime(frame['date'])
+    frame.insert(2, 'amount', frame.pop('cents') / 100)
+    return frame
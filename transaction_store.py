@@ -0,0 +1,299 @@
+#! /usr/bin/env python3
+
+import os
+import copy
+import hashlib
+import numpy as np
+import pandas as pd
+import statement_handler as sh
+import category
+import instrument
+import organizer
+import transfers
+from merchant_cache import keywords_fingerprint
+
+# Bump when the layout of the stored transactions changes, older stores are then rebuilt from the statements
+STORE_VERSION = 4
+COLUMNS = ['date', 'place', 'amount', 'bank', 'source', 'category', 'sub_category', 'duplicate']
+CREDIT_COLUMNS = ['date', 'amount', 'bank', 'source']
+
+
+def file_hash(csv_file):
+    """Hash the content of a statement
+
+    Args:
+        csv_file (str): Path to the statement
+
+    Returns:
+        str: sha256 hex digest of the file
+    """
+
+    digest = hashlib.sha256()
+    with open(csv_file, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def empty_store():
+    """Create a store without any statement
+
+    Returns:
+        dict: [files] = {statement path: {size, mtime, hash}}; [transactions] = dataframe with all the parsed spendings,
+            ordered by date, 'duplicate' being True for the checking account spendings that only move money to another account;
+            [credits] = dataframe with the money credited to the accounts;
+            [tree], [keywords] = category tree and keywords fingerprint the spendings have been categorised with;
+            [recategorised] = {keywords: fingerprint before the last change of category.py, months: months whose
+            spendings changed category then}
+    """
+
+    return {'version': STORE_VERSION,
+            'files': {},
+            'tree': None,
+            'keywords': None,
+            'recategorised': {'keywords': None, 'months': []},
+            'transactions': pd.DataFrame({'date': pd.Series(dtype='datetime64[ns]'),
+                                          'place': pd.Series(dtype=object),
+                                          'amount': pd.Series(dtype=float),
+                                          'bank': pd.Series(dtype=object),
+                                          'source': pd.Series(dtype=object),
+                                          'category': pd.Categorical([], categories=organizer.CATEGORY_NAMES),
+                                          'sub_category': pd.Categorical([], categories=organizer.SUB_CATEGORY_NAMES),
+                                          'duplicate': pd.Series(dtype=bool)}),
+            'credits': pd.DataFrame({'date': pd.Series(dtype='datetime64[ns]'),
+                                     'amount': pd.Series(dtype=float),
+                                     'bank': pd.Series(dtype=object),
+                                     'source': pd.Series(dtype=object)})}
+
+
+def load_store(store_file):
+    """Load the transaction store saved by save_store()
+
+    Args:
+        store_file (str): Path to the store
+
+    Returns:
+        dict: The store. An empty one if it does not exist, is unreadable or has been written by another version
+    """
+
+    if not os.path.exists(store_file):
+        return empty_store()
+    try:
+        store = pd.read_pickle(store_file)
+    except Exception:
+        print(f"Could not read {os.path.basename(store_file)}, all statements will be parsed again")
+        return empty_store()
+
+    if not isinstance(store, dict) or store.get('version') != STORE_VERSION:
+        return empty_store()
+    return store
+
+
+def save_store(store, store_file):
+    """Write the store on disk. The transactions dataframe is pickled as is, its columns are kept as numpy arrays
+
+    Args:
+        store (dict): The store to save
+        store_file (str): Path to the store
+    """
+
+    tmp_file = store_file + '.tmp'
+    pd.to_pickle(store, tmp_file)
+    os.replace(tmp_file, store_file)  # never leave a half written store behind
+
+
+@instrument.profiled
+def update_store(store, csv_files, jobs=1, use_threads=False):
+    """Parse only the statements that are new or have changed since the last update and refresh their transactions
+
+    Args:
+        store (dict): The store to update
+        csv_files (list): Path to all the statements that should be in the store
+        jobs (int, optional): Number of statements parsed at the same time. Defaults to 1.
+        use_threads (bool, optional): Parse with threads instead of processes. Defaults to False.
+
+    Returns:
+        list: The statements whose transactions have been added, replaced or removed
+    """
+
+    files = store['files']
+    changed = [source for source in files if source not in csv_files]  # statements that have been deleted
+    to_parse = {}
+
+    for csv_file in csv_files:
+        stat = os.stat(csv_file)
+        known = files.get(csv_file)
+        if known is not None and known['size'] == stat.st_size and known['mtime'] == stat.st_mtime:
+            continue
+
+        signature = {'size': stat.st_size, 'mtime': stat.st_mtime, 'hash': file_hash(csv_file)}
+        if known is not None and known['hash'] == signature['hash']:
+            files[csv_file] = signature  # only touched
+        else:
+            to_parse[csv_file] = signature
+
+    # Extract csv into dataframe, handle each bank statement accordingly. A statement that fails to parse keeps its previous
+    # transactions and will be parsed again on the next update
+    parsed, _ = sh.parse_statements(list(to_parse), jobs=jobs, use_threads=use_threads, credits=True)
+    new_frames = []
+    new_credits = []
+    for csv_file, (statement_df, credits_df) in parsed:
+        bank = sh.detect_bank(csv_file)
+        new_frames.append(statement_df.assign(bank=bank, source=csv_file))
+        new_credits.append(credits_df.assign(bank=bank, source=csv_file))
+        files[csv_file] = to_parse[csv_file]
+        changed.append(csv_file)
+
+    for source in changed:
+        if source not in csv_files:
+            del files[source]
+
+    if changed:
+        transactions = store['transactions']
+        transactions = transactions[~transactions['source'].isin(changed)]
+        store['transactions'] = by_date(pd.concat([transactions] + new_frames, ignore_index=True, sort=False)[COLUMNS])
+        credits = store['credits']
+        credits = credits[~credits['source'].isin(changed)]
+        store['credits'] = pd.concat([credits] + new_credits, ignore_index=True, sort=False)[CREDIT_COLUMNS]
+        flag_duplicates(store)
+
+    return changed
+
+
+def checking_rows(transactions):
+    """Tell the transactions read from checking account statements
+
+    Args:
+        transactions (pandas.core.frame.DataFrame): Transactions with a 'bank' column
+
+    Returns:
+        numpy.ndarray: True for the checking account transactions
+    """
+
+    return transactions['bank'].map(lambda bank: sh.BANK_SCHEMAS[bank]['account'] == sh.CHECKING).values.astype(bool)
+
+
+def by_date(transactions):
+    """Order transactions by date. The transactions of the store are kept in this order: a date range is then found by
+    binary search, without sorting the store on every query, see query.DateIndex
+
+    The new transactions are appended to the ones already in order: the stable sort only has to merge sorted runs.
+
+    Args:
+        transactions (pandas.core.frame.DataFrame): Transactions with a 'date' column
+
+    Returns:
+        pandas.core.frame.DataFrame: The transactions ordered by date, transactions of a same date in their order
+    """
+
+    order = np.argsort(transactions['date'].values, kind='stable')
+    return transactions.take(order).reset_index(drop=True)
+
+
+def flag_duplicates(store):
+    """Flag the checking account spendings that only move money to another account: credit card payments and transfers.
+    The spendings they paid for are already in the other account's statements
+
+    Args:
+        store (dict): The store, its 'duplicate' column is updated in place
+    """
+
+    transactions = store['transactions']
+    checking = checking_rows(transactions)
+    duplicate = np.zeros(len(transactions), dtype=bool)
+    duplicate[checking] = transfers.match_transfers(transactions[checking], store['credits'])
+
+    if duplicate.any():
+        print(f"Ignore {duplicate.sum()} checking account spendings paying a credit card or moving money to another account")
+    store['transactions'] = transactions.assign(duplicate=duplicate)
+
+
+def stream_spendings(chunks):
+    """Leave out of a stream of statement chunks the checking account spendings that only move money to another
+    account, as flag_duplicates() does for the store
+
+    The credit card spendings are passed on as soon as they are read. The checking account spendings can only be matched
+    once every credit has been read: they are held, along with the credits, and passed on at the end of the stream.
+
+    Args:
+        chunks (iterable): (spendings, credits) of each chunk, see statement_handler.iter_statement_chunks()
+
+    Yields:
+        pandas.core.frame.DataFrame: The spendings to account for
+    """
+
+    withdrawals, credits = [], []
+    for statement_df, credits_df in chunks:
+        checking = checking_rows(statement_df)
+        withdrawals.append(statement_df[checking])
+        credits.append(credits_df)
+        yield statement_df[~checking]
+
+    withdrawals = pd.concat(withdrawals, ignore_index=True) if withdrawals else pd.DataFrame(columns=COLUMNS)
+    if not withdrawals.empty:
+        duplicate = transfers.match_transfers(withdrawals, pd.concat(credits, ignore_index=True))
+        if duplicate.any():
+            print(f"Ignore {duplicate.sum()} checking account spendings paying a credit card or moving money to another account")
+        yield withdrawals[~duplicate]
+
+
+def spendings(store):
+    """Get the spendings of the store, without the ones flagged as duplicates
+
+    Args:
+        store (dict): The store
+
+    Returns:
+        pandas.core.frame.DataFrame: The spendings to account for
+    """
+
+    transactions = store['transactions']
+    return transactions[~transactions['duplicate'].values.astype(bool)]
+
+
+@instrument.profiled
+def categorise_store(store):
+    """Give their category and sub category to the spendings of the store
+
+    New spendings are categorised. When category.py has changed, only the spendings whose category may change are
+    categorised again, see organizer.recategorisation_candidates()
+
+    Args:
+        store (dict): The store to categorise, after update_store()
+
+    Returns:
+        list: The months having spendings that changed category, new spendings aside, i.e: ['2020-01', '2020-04']
+    """
+
+    transactions = store['transactions']
+    keywords = keywords_fingerprint()
+    to_categorise = transactions['category'].isna().values
+
+    if store['keywords'] != keywords:
+        candidates = None if store['tree'] is None else organizer.recategorisation_candidates(transactions, store['tree'])
+        to_categorise = np.ones(len(transactions), dtype=bool) if candidates is None else candidates | to_categorise
+
+    months = []
+    if to_categorise.any():
+        print(f"Categorise {to_categorise.sum()} of {len(transactions)} spendings")
+        categories = transactions['category'].astype(object).values
+        sub_categories = transactions['sub_category'].astype(object).values
+        new_categories, new_sub_categories = organizer.tree_labels(transactions['place'][to_categorise])
+
+        changed = to_categorise.copy()
+        changed[to_categorise] = ((categories[to_categorise] != new_categories) | (sub_categories[to_categorise] != new_sub_categories)) \
+            & ~transactions['category'].isna().values[to_categorise]
+        months = list(np.datetime_as_string(np.unique(transactions['date'].values[changed].astype('datetime64[M]'))))
+
+        categories[to_categorise] = new_categories
+        sub_categories[to_categorise] = new_sub_categories
+        store['transactions'] = transactions.assign(
+            category=pd.Categorical(categories, categories=organizer.CATEGORY_NAMES),
+            sub_category=pd.Categorical(sub_categories, categories=organizer.SUB_CATEGORY_NAMES))
+
+    if store['keywords'] != keywords:
+        store['recategorised'] = {'keywords': store['keywords'], 'months': months}
+        store['tree'] = copy.deepcopy(category.Tree)
+        store['keywords'] = keywords
+
+    return months
@@ -0,0 +1,75 @@
+#! /usr/bin/env python3
+
+import os
+import numpy as np
+import pandas as pd
+import instrument
+
+# A transfer can take a few days to show up on the other account
+WINDOW_DAYS = 5
+
+
+def statement_accounts(transactions):
+    """Tell the account each transaction comes from: the statements of an account are the ones of a same bank kept in a
+    same folder, i.e: statements/Checking/chequing and statements/Checking/savings are two accounts
+
+    Args:
+        transactions (pandas.core.frame.DataFrame): Transactions with 'bank' and 'source' columns
+
+    Returns:
+        numpy.ndarray: The account of each transaction
+    """
+
+    codes, uniques = pd.factorize(pd.MultiIndex.from_arrays([transactions['bank'].values, transactions['source'].values]))
+    accounts = np.array([f"{bank}:{os.path.dirname(source)}" for bank, source in uniques], dtype=object)
+    return accounts[codes]
+
+
+def _day_keys(transactions, window_days):
+    days = transactions['date'].values.astype('datetime64[D]').astype(np.int64)
+    return pd.DataFrame({'cents': np.rint(transactions['amount'].values.astype(float) * 100).astype(np.int64),
+                         'day': days,
+                         'bucket': days // max(window_days, 1),
+                         'account': statement_accounts(transactions)})
+
+
+@instrument.profiled
+def match_transfers(withdrawals, credits, window_days=WINDOW_DAYS):
+    """Find the withdrawals that are the other side of a credit on another account: credit card payments and transfers
+    between accounts, which would otherwise be accounted twice
+
+    Withdrawals and credits are joined on a hash index of (amount, date window): a withdrawal only meets the credits of
+    the same amount in its window and the two next to it, never all the credits. Each credit matches at most one
+    withdrawal, the closest in time. Accounts are told apart by statement_accounts().
+
+    Args:
+        withdrawals (pandas.core.frame.DataFrame): Checking account spendings: [date, amount, bank, source]
+        credits (pandas.core.frame.DataFrame): Money credited to any account, as positive values: [date, amount, bank, source]
+        window_days (int, optional): Maximum number of days between a withdrawal and its credit. Defaults to WINDOW_DAYS.
+
+    Returns:
+        numpy.ndarray: True for the withdrawals matching a credit
+    """
+
+    matched = np.zeros(len(withdrawals), dtype=bool)
+    if withdrawals.empty or credits.empty:
+        return matched
+
+    withdrawal_keys = _day_keys(withdrawals, window_days).assign(withdrawal=np.arange(len(withdrawals)))
+    credit_keys = _day_keys(credits, window_days).assign(credit=np.arange(len(credits)))
+
+    # Each credit is indexed in its own date window and the two next to it
+    credit_keys = pd.concat([credit_keys.assign(bucket=credit_keys['bucket'] + offset) for offset in (-1, 0, 1)],
+                            ignore_index=True)
+    pairs = withdrawal_keys.merge(credit_keys, on=['cents', 'bucket'], suffixes=('', '_credit'))
+    # Two statements of a same account, i.e: consecutive months, never pay each other
+    pairs = pairs[(pairs['account'] != pairs['account_credit'])]
+    pairs = pairs.assign(distance=(pairs['day'] - pairs['day_credit']).abs())
+    pairs = pairs[pairs['distance'] <= window_days].sort_values(['distance', 'withdrawal', 'credit'], kind='mergesort')
+
+    used_credits = set()
+    for withdrawal, credit in zip(pairs['withdrawal'].values, pairs['credit'].values):
+        if not matched[withdrawal] and credit not in used_credits:
+            matched[withdrawal] = True
+            used_credits.add(credit)
+    return matched
@@ -0,0 +1,106 @@
+#! /usr/bin/env python3
+
+import os
+import time
+import matplotlib.pyplot as plt
+import dashboard
+import overview
+import render
+
+
+def wait_until_settled(report, debounce):
+    """Wait until the statements stop changing: a burst of files dropped at once is ingested in one go, and a file
+    still being copied is not parsed half written
+
+    Args:
+        report (dashboard.Dashboard): The watched spendings
+        debounce (float): Seconds the statements must stay unchanged
+
+    Returns:
+        tuple: The statements signature once settled, see dashboard.Dashboard.statements_signature()
+    """
+
+    signature = report.statements_signature()
+    while signature != report.signature:
+        time.sleep(debounce)
+        settled, signature = signature, report.statements_signature()
+        if settled == signature:
+            break
+    return signature
+
+
+def write_report(report, figures, output_pdf, fast=False):
+    """Build again the pages whose monthly spendings changed and write the PDF
+
+    Args:
+        report (dashboard.Dashboard): The refreshed spendings
+        figures (dict): [page name] = (fingerprint, figure) of each page already built, updated in place
+        output_pdf (str): Path to the PDF to write
+        fast (bool, optional): Build the pages with the fast rendering, see render.build_page(). Defaults to False.
+
+    Returns:
+        list: Name of the pages built again
+    """
+
+    rebuilt = []
+    for name, (fingerprint, page) in report.pages.items():
+        built = figures.get(name)
+        if built is not None and built[0] == fingerprint:
+            continue
+        # The figure of the previous version of the page is drawn into again, along with its layout
+        figures[name] = (fingerprint, render.build_page(page, fig=built and built[1], fast=fast))
+        rebuilt.append(name)
+
+    if rebuilt:
+        render.write_pdf([figures[name][1] for name in overview.PAGE_NAMES], output_pdf)
+        print(f"Pages rebuilt: {', '.join(rebuilt)}. Output PDF document: {output_pdf}")
+    else:
+        print("No page changed")
+    return rebuilt
+
+
+def watch(statements_folder, output_pdf, interval=2.0, debounce=1.0, fast=False, jobs=1, use_threads=False):
+    """Keep the overview PDF up to date until interrupted (Ctrl-C)
+
+    The statement folders are polled: a new or modified statement is the only one parsed, its spendings are folded into
+    the monthly matrices of the months it covers and only the pages drawn from these months are built again.
+
+    Args:
+        statements_folder (str): Path to the statements folder, holding CreditCard and optionally Checking
+        output_pdf (str): Path to the PDF to write, the transaction store and the monthly spendings cache are kept next to it
+        interval (float, optional): Seconds between two polls of the statement folders. Defaults to 2.0.
+        debounce (float, optional): Seconds the statements must stay unchanged before being ingested. Defaults to 1.0.
+        fast (bool, optional): Build the pages with the fast rendering, see render.build_page(). Defaults to False.
+        jobs (int, optional): Number of statements parsed at the same time. Defaults to 1.
+        use_threads (bool, optional): Parse with threads instead of processes. Defaults to False.
+
+    Raises:
+        FileNotFoundError: If the statements folder or the PDF's folder do not exist
+    """
+
+    if not (os.path.exists(os.path.dirname(output_pdf))):
+        raise FileNotFoundError(f"Could not access {os.path.dirname(output_pdf)} to output the results. Please verify path syntax")
+
+    plt.switch_backend('Agg')  # the figures are kept open between updates, never show them
+    # To get rid of pandas' matplotlib "FutureWarning"
+    from pandas.plotting import register_matplotlib_converters
+    register_matplotlib_converters()
+
+    report = dashboard.Dashboard(statements_folder, os.path.dirname(output_pdf), jobs=jobs, use_threads=use_threads)
+    figures = {}
+    report.refresh()
+    write_report(report, figures, output_pdf, fast)
+
+    print(f"Watching {statements_folder} every {interval}s (Ctrl-C to stop)")
+    try:
+        while True:
+            time.sleep(interval)
+            try:
+                signature = wait_until_settled(report, debounce)
+                if report.refresh(signature):
+                    write_report(report, figures, output_pdf, fast)
+            except OSError as error:
+                # i.e: a statement deleted while being read, it will be seen on the next poll
+                print(f"** ERROR ** {error}")
+    except KeyboardInterrupt:
+        print()